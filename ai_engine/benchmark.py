@@ -0,0 +1,275 @@
+"""
+In-process load test for the ai_engine endpoints (/agent1, /agent2, /throttle).
+
+Runs the FastAPI app through httpx's ASGI transport against the stub LLM
+(LLM_MODE=stub), so no Gemini quota or backend is needed. Every scenario is
+driven at increasing concurrency and reports throughput, p50/p95/p99 latency,
+event-loop lag and RSS growth.
+
+    python benchmark.py --concurrency 1,16,64 --requests 200 --llm-latency-ms 300
+    python benchmark.py --scenarios agent1 --graph-mode fused --json results.json
+    python benchmark.py --cold-start 5          # worker boot: import, ready, first response
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ai_engine load test against a stub LLM")
+    parser.add_argument("--scenarios", default="agent1,agent2,throttle,mixed",
+                        help="Comma separated: agent1, agent2, throttle, mixed")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario and concurrency level")
+    parser.add_argument("--mix", default="agent1=0.8,agent2=0.1,throttle=0.1", help="Weights for the mixed scenario")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--graph-mode", default=None, help="agent1 graph mode (parallel / fused)")
+    parser.add_argument("--routes", type=int, default=50, help="Routes per /agent2 payload")
+    parser.add_argument("--rooms", type=int, default=500, help="Distinct chat rooms")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write results to this file")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="N",
+                        help="Instead of the load test, boot N fresh worker processes and time them")
+    return parser.parse_args()
+
+
+# --- 1. ENVIRONMENT (must be set before the app is imported) ---
+def configure_env(args) -> str:
+    """Points the app at the stub LLM and a scratch state directory, which is returned for cleanup."""
+    os.environ["LLM_MODE"] = "stub"
+    os.environ["LLM_INJECTED_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["LLM_INJECTED_JITTER_MS"] = str(args.llm_jitter_ms)
+    os.environ["LLM_STUB_FAILURE_RATE"] = str(args.llm_failure_rate)
+    os.environ.setdefault("LLM_STUB_TOOL_CALL_RATE", "0.1")
+    # Nothing listens here, so backend calls fail fast instead of hanging; always overridden,
+    # a BACKEND_URL exported in the shell may be a real backend
+    os.environ["BACKEND_URL"] = "http://127.0.0.1:9"
+    # Fake alerts left in the outbox would be delivered by the next real server start,
+    # so every on-disk store lives in a scratch directory that is removed afterwards
+    state_dir = tempfile.mkdtemp(prefix="ai_engine_bench_")
+    os.environ["OUTBOX_DB"] = os.path.join(state_dir, "outbox.db")
+    os.environ["CHECKPOINT_DB"] = os.path.join(state_dir, "checkpoints.sqlite")
+    for name in ("EXPERT_CACHE_DB", "FLAG_COOLDOWN_DB"):
+        if os.getenv(name):  # keep the disk tier under test if enabled, but off the real file
+            os.environ[name] = os.path.join(state_dir, name.lower() + ".sqlite")
+    return state_dir
+
+
+# --- 2. REALISTIC PAYLOADS ---
+SMALL_TALK = ["hi", "hello again", "ok", "on my way", "thanks!", "see you soon", "lol"]
+AMBIGUOUS = ["where are you right now?", "why aren't you answering", "send me a pic",
+             "you looked nice today", "what time do you get off the metro?", "I'm outside"]
+DANGER = ["he is following me", "please help", "stop texting me", "I know where you live",
+          "call the police", "someone grabbed my arm"]
+
+
+def chat_payload(args) -> Dict[str, Any]:
+    room = f"room-{random.randrange(args.rooms)}"
+    pool = random.choices([SMALL_TALK, AMBIGUOUS, DANGER], weights=[0.6, 0.3, 0.1])[0]
+    history = [{"userId": random.choice(["u1", "u2"]), "message": random.choice(SMALL_TALK + AMBIGUOUS)}
+               for _ in range(random.randint(0, 30))]
+    body = {"roomId": room, "messages": history, "currentUserMessage": random.choice(pool), "currentUserId": "u1"}
+    if args.graph_mode:
+        body["mode"] = args.graph_mode
+    return body
+
+
+def surveillance_payload(args) -> Dict[str, Any]:
+    payload = {}
+    for i in range(args.routes):
+        scores = [float(random.randint(7, 10)) for _ in range(random.randint(3, 20))]
+        if random.random() < 0.05:
+            scores += [4.0, 3.0, 2.0]
+        payload[f"route-{i}"] = scores
+    return {"payload": payload}
+
+
+def throttle_payload(args) -> Dict[str, Any]:
+    history = [{"userId": random.choice(["u1", "u2"]), "message": random.choice(AMBIGUOUS + DANGER)}
+               for _ in range(random.randint(1, 40))]
+    return {"userId": "u1", "routeId": f"route-{random.randrange(args.routes)}", "message": history}
+
+
+ENDPOINTS = {
+    "agent1": ("/agent1", chat_payload),
+    "agent2": ("/agent2", surveillance_payload),
+    "throttle": ("/throttle", throttle_payload),
+}
+
+
+# --- 3. MEASUREMENT ---
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def loop_lag_monitor(samples: List[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    """Records how late a 10 ms sleep wakes up: blocking work on the event loop shows up here."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def run_level(client, args, scenario: str, concurrency: int, rss) -> Dict[str, Any]:
+    if scenario == "mixed":
+        weights = dict(item.split("=") for item in args.mix.split(","))
+        names = list(weights)
+        picks = random.choices(names, weights=[float(weights[n]) for n in names], k=args.requests)
+    else:
+        picks = [scenario] * args.requests
+
+    latencies: Dict[str, List[float]] = {name: [] for name in ENDPOINTS}
+    errors: Dict[str, int] = {name: 0 for name in ENDPOINTS}
+    queue: asyncio.Queue = asyncio.Queue()
+    for name in picks:
+        queue.put_nowait(name)
+
+    async def worker():
+        while not queue.empty():
+            name = queue.get_nowait()
+            path, make_payload = ENDPOINTS[name]
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=make_payload(args))
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies[name].append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors[name] += 1
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(loop_lag_monitor(lag, stop))
+    rss_before = rss()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    result = {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(picks),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(picks) / elapsed, 1) if elapsed else 0.0,
+        "loop_lag_ms": {
+            "p50": round(percentile(lag, 50), 2),
+            "p99": round(percentile(lag, 99), 2),
+            "max": round(max(lag), 2) if lag else 0.0,
+        },
+        "rss_delta_mb": round((rss() - rss_before) / 1024 / 1024, 2),
+        "endpoints": {},
+    }
+    for name, values in latencies.items():
+        if values:
+            result["endpoints"][name] = {
+                "count": len(values),
+                "errors": errors[name],
+                "p50_ms": round(percentile(values, 50), 1),
+                "p95_ms": round(percentile(values, 95), 1),
+                "p99_ms": round(percentile(values, 99), 1),
+                "mean_ms": round(statistics.mean(values), 1),
+            }
+    return result
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    lag = result["loop_lag_ms"]
+    print(f"\n[{result['scenario']}] concurrency={result['concurrency']} "
+          f"throughput={result['throughput_rps']} req/s  loop-lag p99={lag['p99']}ms max={lag['max']}ms  "
+          f"rss +{result['rss_delta_mb']}MB")
+    for name, stats in result["endpoints"].items():
+        print(f"   {name:<9} n={stats['count']:<5} err={stats['errors']:<4} "
+              f"p50={stats['p50_ms']:>8}ms  p95={stats['p95_ms']:>8}ms  p99={stats['p99_ms']:>8}ms")
+
+
+async def main(args) -> List[Dict[str, Any]]:
+    import httpx
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as engine
+    from brain.checkpoint import process_rss_bytes
+
+    results = []
+    transport = httpx.ASGITransport(app=engine.app)
+    async with engine.lifespan(engine.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://ai-engine", timeout=None) as client:
+        for scenario in args.scenarios.split(","):
+            for concurrency in (int(c) for c in args.concurrency.split(",")):
+                result = await run_level(client, args, scenario, concurrency, process_rss_bytes)
+                print_result(result)
+                results.append(result)
+    return results
+
+
+# --- 4. COLD START ---
+COLD_START_SCRIPT = """
+import json, time, asyncio
+started = time.perf_counter()
+import main as engine
+imported = time.perf_counter()
+import httpx
+
+async def boot():
+    transport = httpx.ASGITransport(app=engine.app)
+    async with engine.lifespan(engine.app), \\
+            httpx.AsyncClient(transport=transport, base_url="http://ai-engine", timeout=None) as client:
+        ready = time.perf_counter()
+        body = {"roomId": "cold", "messages": [], "currentUserMessage": "where are you right now?", "currentUserId": "u1"}
+        response = await client.post("/agent1", json=body)
+        return ready, time.perf_counter(), response.status_code
+
+ready, first, status = asyncio.run(boot())
+print(json.dumps({"import_s": imported - started, "ready_s": ready - started,
+                  "first_response_s": first - started, "status": status}))
+"""
+
+
+def cold_start(args) -> Dict[str, Any]:
+    """Boots fresh interpreters (import main, enter the lifespan, serve one /agent1 request)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(args.cold_start):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], cwd=here, env=os.environ,
+                             capture_output=True, text=True, check=True)
+        run = json.loads(out.stdout.strip().splitlines()[-1])
+        run["process_s"] = time.perf_counter() - started
+        runs.append(run)
+
+    result = {"scenario": "cold_start", "runs": len(runs)}
+    for key in ("import_s", "ready_s", "first_response_s", "process_s"):
+        values = [r[key] for r in runs]
+        result[key] = {"median": round(statistics.median(values), 3), "max": round(max(values), 3)}
+    print(f"\n[cold_start] runs={len(runs)}  " + "  ".join(
+        f"{key}={result[key]['median']}s" for key in ("import_s", "ready_s", "first_response_s", "process_s")))
+    return result
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    random.seed(args.seed)
+    state_dir = configure_env(args)
+    try:
+        results = [cold_start(args)] if args.cold_start else asyncio.run(main(args))
+    finally:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Loaded once for the whole package: brain modules read their config from the environment at import
+load_dotenv()
@@ -0,0 +1,178 @@
+import os
+import math
+import time
+import asyncio
+import contextlib
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# --- CONFIG ---
+# Per endpoint: ADMISSION_<NAME>_MAX_IN_FLIGHT / _MAX_QUEUE / _QUEUE_TIMEOUT / _DEGRADE_QUEUE
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ROOM_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_ROOM_MAX_IN_FLIGHT", "4"))  # running + queued /agent1 calls per room
+RETRY_AFTER_MAX = int(os.getenv("ADMISSION_RETRY_AFTER_MAX", "30"))
+
+
+class Overloaded(Exception):
+    """Request refused by admission control; main.py turns it into a 429/503 with Retry-After."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Bounded admission for one endpoint: at most `max_in_flight` requests run,
+    up to `max_queue` more wait in FIFO order for at most `queue_timeout` seconds,
+    and anything beyond that is refused at once instead of piling up. A room
+    (when given) may hold at most `room_limit` running or queued requests.
+
+    `degrade_queue` > 0 lets the endpoint answer from a local heuristic instead
+    of queuing once that many requests are already waiting (see `should_degrade`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        degrade_queue: int = 0,
+        room_limit: int = ROOM_MAX_IN_FLIGHT,
+    ):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.degrade_queue = degrade_queue
+        self.room_limit = room_limit
+        self._reset(None)
+        self.service_seconds = 1.0  # EWMA of how long an admitted request holds its slot
+        self.admitted = 0
+        self.rejected_room = 0
+        self.rejected_full = 0
+        self.timed_out = 0
+        self.degraded = 0
+
+    def _reset(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        # Waiters are futures of one loop, so a new loop starts from a clean gate
+        self._loop = loop
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._rooms: Dict[str, int] = {}
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained, from the recent service time."""
+        waves = (len(self._waiters) + 1) / self.max_in_flight
+        return max(1, min(RETRY_AFTER_MAX, math.ceil(self.service_seconds * waves)))
+
+    def should_degrade(self) -> bool:
+        if not ADMISSION_ENABLED or self.degrade_queue <= 0 or len(self._waiters) < self.degrade_queue:
+            return False
+        self.degraded += 1
+        return True
+
+    def check(self, room: Optional[str] = None) -> None:
+        """Raises Overloaded if a request arriving now would be refused without queuing."""
+        if not ADMISSION_ENABLED:
+            return
+        if room is not None and self.room_limit > 0 and self._rooms.get(room, 0) >= self.room_limit:
+            self.rejected_room += 1
+            raise Overloaded(429, f"Too many concurrent requests for room {room}", self.retry_after())
+        if self._in_flight >= self.max_in_flight and len(self._waiters) >= self.max_queue:
+            self.rejected_full += 1
+            raise Overloaded(503, f"{self.name} is overloaded", self.retry_after())
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+        future = self._loop.create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            self.timed_out += 1
+            raise Overloaded(503, f"{self.name} queue wait exceeded {self.queue_timeout:g}s", self.retry_after())
+        except asyncio.CancelledError:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            elif future.done() and not future.cancelled():
+                self._release()  # the slot was handed over just as the caller went away
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # Hand the slot straight to the oldest waiter; in_flight stays the same
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def admit(self, room: Optional[str] = None):
+        if not ADMISSION_ENABLED:
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+        self.check(room)
+        if room is not None:
+            self._rooms[room] = self._rooms.get(room, 0) + 1
+        try:
+            await self._acquire()
+            self.admitted += 1
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self.service_seconds += 0.2 * (time.monotonic() - started - self.service_seconds)
+                self._release()
+        finally:
+            if room is not None:
+                self._rooms[room] -= 1
+                if not self._rooms[room]:
+                    del self._rooms[room]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "rooms": len(self._rooms),
+            "admitted": self.admitted,
+            "rejected_room": self.rejected_room,
+            "rejected_full": self.rejected_full,
+            "timed_out": self.timed_out,
+            "degraded": self.degraded,
+            "service_seconds": round(self.service_seconds, 3),
+        }
+
+
+def _gate(name: str, max_in_flight: int, max_queue: int, queue_timeout: float, degrade_queue: int = 0,
+          room_limit: int = ROOM_MAX_IN_FLIGHT) -> AdmissionGate:
+    prefix = f"ADMISSION_{name.upper()}_"
+    return AdmissionGate(
+        name,
+        max_in_flight=int(os.getenv(prefix + "MAX_IN_FLIGHT", str(max_in_flight))),
+        max_queue=int(os.getenv(prefix + "MAX_QUEUE", str(max_queue))),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", str(queue_timeout))),
+        degrade_queue=int(os.getenv(prefix + "DEGRADE_QUEUE", str(degrade_queue))),
+        room_limit=room_limit,
+    )
+
+
+# The throttle gate only covers the sync analysis and never refuses an alert: main.py stores the
+# raw alert before the gate and, once the short queue deadline passes, answers at once and
+# analyses later, so an SOS never waits seconds for a slot
+gates = {
+    "agent1": _gate("agent1", max_in_flight=64, max_queue=256, queue_timeout=5, degrade_queue=128),
+    "agent2": _gate("agent2", max_in_flight=4, max_queue=16, queue_timeout=10),
+    "throttle": _gate("throttle", max_in_flight=32, max_queue=128, queue_timeout=0.5),
+}
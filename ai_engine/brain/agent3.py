@@ -1,30 +1,27 @@
-import os
-import requests 
-from typing import List, Optional, Annotated, Dict, Any
+import uuid
+import logging
+from typing import List, Optional
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
 from langgraph.graph import END, START, StateGraph
 from langchain_core.messages import HumanMessage
 from datetime import datetime, timezone
-
-load_dotenv()
-
-
-if not os.getenv("GOOGLE_API_KEY"):
-    raise ValueError("GOOGLE_API_KEY not found! Please check your ai_engine/.env file.")
-
-class FrontendMessage(BaseModel):
-    userId: str
-    message: str
+from brain.llm_provider import get_chat_model
+from brain.llm_scheduler import llm_priority, EMERGENCY
+from brain.hedging import hedged
+from brain.metrics import timed_node, log_event
+from brain.outbox import outbox
+from brain.schemas import FrontendMessage
+from brain import history_window
+from brain.history_window import EMERGENCY_HISTORY_TOKENS
 
 class GraphState(BaseModel):
     userId: str = Field(description="The ID of the user who pressed the throttle")
     routeId: Optional[str] = Field(default=None, description="The active route ID")
     message: List[FrontendMessage] = Field(description="Chat history")
     context: Optional[str] = Field(default=None, description="AI Analysis Result")
+    alertId: Optional[str] = Field(default=None, description="Set when the raw alert was already forwarded")
 
-flash_model = ChatGoogleGenerativeAI(
+flash_model = get_chat_model(
     model="gemini-2.0-flash",
     temperature=0, 
     max_retries=2,
@@ -36,10 +33,10 @@ async def analyzeEmergency(state: GraphState):
     """
     Analyzes chat history.
     """
-    print(f"--- ANALYZING EMERGENCY FOR USER: {state.userId} ---")
+    log_event("emergency_analysis", user=state.userId, route=state.routeId, sampled=False)
     
-    rawHistory = state.message
-    history_str = "\n".join([f"[{m.userId}]: {m.message}" for m in rawHistory]) if rawHistory else "No recent chat history."
+    # Bounded by a token budget however long the room is; high-risk messages are kept preferentially
+    history_str = history_window.render(state.message, EMERGENCY_HISTORY_TOKENS)
 
     prompt = f"""
     You are an emergency safety analysis AI. 
@@ -55,52 +52,68 @@ async def analyzeEmergency(state: GraphState):
     2. If normal, state: "No textual anomaly detected, but throttle pressed by user."
     """
     
-    response = await flash_model.ainvoke([HumanMessage(content=prompt)])
+    with llm_priority(EMERGENCY), hedged("analyzeEmergency"):
+        response = await flash_model.ainvoke([HumanMessage(content=prompt)])
     
 
     return {"context": response.content}
 
 async def saveToDatabase(state: GraphState):
     """
-    Sends the analyzed data to your Node.js Backend.
+    Queues the analyzed data for your Node.js Backend. The outbox worker
+    delivers it (with retries), so a slow or down backend never blocks here.
     """
     current_time = datetime.now(timezone.utc).isoformat()
     
-    payload = {
-        "triggeredByUserId": state.userId,
-        "routeId": state.routeId,
-        "aiAnalysis": state.context,
-        "alertLevel": "HIGH",
-        "timestamp": current_time
-    }
-    backend_url = os.getenv("BACKEND_URL", "http://localhost:3000")
-    endpoint = f"{backend_url}/api/room/throttle-room"
+    if state.alertId:
+        # The raw alert is already stored: only attach the analysis to it
+        endpoint = "/api/room/throttle-room/enrich"
+        payload = {
+            "alertId": state.alertId,
+            "aiAnalysis": state.context,
+            "analyzedAt": current_time
+        }
+    else:
+        # Keyed by alertId so a redelivered record updates the same alert instead of adding another
+        endpoint = "/api/room/throttle-room"
+        payload = {
+            "alertId": uuid.uuid4().hex,
+            "triggeredByUserId": state.userId,
+            "routeId": state.routeId,
+            "aiAnalysis": state.context,
+            "alertLevel": "HIGH",
+            "timestamp": current_time
+        }
     try:
-        response = requests.post(endpoint, json=payload)
-        
-        response.raise_for_status()
-        
-        print(f" SUCCESS: Backend received the log. Status Code: {response.status_code}")
-        
-    except requests.exceptions.ConnectionError:
-        print(f" ERROR: Could not connect to backend at {backend_url}. Is the Node server running?")
-    except requests.exceptions.HTTPError as e:
-        print(f"ERROR: Backend returned an error: {e}")
+        record_id = outbox.enqueue(endpoint, payload)
+        log_event("emergency_queued", id=record_id, endpoint=endpoint)
     except Exception as e:
-        print(f" ERROR: An unexpected error occurred: {e}")
-
+        log_event("emergency_queue_failed", level=logging.ERROR, endpoint=endpoint, error=str(e))
+        raise
 
     return {}
 
 
 graph = StateGraph(GraphState)
 
-graph.add_node("analyzeEmergency", analyzeEmergency)
-graph.add_node("saveToDatabase", saveToDatabase)
+graph.add_node("analyzeEmergency", timed_node("agent3", "analyzeEmergency", analyzeEmergency))
+graph.add_node("saveToDatabase", timed_node("agent3", "saveToDatabase", saveToDatabase))
 
 graph.add_edge(START, "analyzeEmergency")
 graph.add_edge("analyzeEmergency", "saveToDatabase")
 graph.add_edge("saveToDatabase", END)
 
-analyze_emergency = graph.compile()
+_analyze_emergency = None
+
+def get_emergency_graph():
+    """The compiled emergency graph, compiled on first use."""
+    global _analyze_emergency
+    if _analyze_emergency is None:
+        _analyze_emergency = graph.compile()
+    return _analyze_emergency
+
+def __getattr__(name):
+    if name == "analyze_emergency":
+        return get_emergency_graph()
+    raise AttributeError(name)
 
@@ -0,0 +1,59 @@
+import os
+import json
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# --- 1. POLICY ---
+class AggregationPolicy(BaseModel):
+    enabled: bool = Field(default=True, description="False = always ask final_judge")
+    sentiment_weight: float = Field(default=0.1, description="Weight of (1 - sentiment) in the risk")
+    urgency_weight: float = Field(default=0.45)
+    severity_weight: float = Field(default=0.45)
+    safe_max: float = Field(default=0.15, description="Urgency and severity at or below this = experts agree it is safe")
+    critical_min: float = Field(default=0.85, description="Urgency and severity at or above this = experts agree it is critical")
+    max_spread: float = Field(default=0.2, description="Max urgency/severity disagreement allowed to skip the judge")
+    safe_floor: float = Field(default=9.0, description="Lowest final score for an agreed-safe message")
+    critical_ceiling: float = Field(default=3.0, description="Highest final score for an agreed-critical message")
+
+
+def load_policy() -> AggregationPolicy:
+    """Defaults, overridden by the JSON file at AGGREGATION_POLICY_PATH and AGGREGATION_ENABLED."""
+    data = {}
+    path = os.getenv("AGGREGATION_POLICY_PATH")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    if os.getenv("AGGREGATION_ENABLED") is not None:
+        data["enabled"] = os.getenv("AGGREGATION_ENABLED").lower() in ("1", "true", "yes")
+    return AggregationPolicy(**data)
+
+
+policy = load_policy()
+
+
+# --- 2. AGGREGATION ---
+class Aggregate(BaseModel):
+    score: float
+    risk: float
+    confidence: float
+    band: Optional[str]  # "safe", "critical" or None when the experts disagree
+
+
+def aggregate(sentiment: float, urgency: float, severity: float, p: AggregationPolicy = policy) -> Aggregate:
+    """Weighted risk over the three expert scores plus a safe/critical band when they agree."""
+    total = p.sentiment_weight + p.urgency_weight + p.severity_weight
+    risk = (p.sentiment_weight * (1 - sentiment) + p.urgency_weight * urgency + p.severity_weight * severity) / total
+    score = round(10 - 9 * risk, 1)
+    spread = abs(urgency - severity)
+    confidence = max(0.0, 1 - spread)
+
+    band = None
+    if spread <= p.max_spread:
+        if urgency <= p.safe_max and severity <= p.safe_max:
+            band = "safe"
+            score = max(score, p.safe_floor)
+        elif urgency >= p.critical_min and severity >= p.critical_min:
+            band = "critical"
+            score = min(score, p.critical_ceiling)
+
+    return Aggregate(score=score, risk=risk, confidence=confidence, band=band)
@@ -0,0 +1,88 @@
+import os
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+# --- CONFIG ---
+BATCH_ENABLED = os.getenv("EXPERT_BATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("EXPERT_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("EXPERT_BATCH_MAX_WAIT_MS", "5"))
+
+
+class BatchMiss(LookupError):
+    """The batch call returned no result for this message."""
+
+
+class MicroBatcher:
+    """
+    Collects items submitted within `max_wait_ms` of each other (across rooms and
+    requests), runs them through one `score_batch` call of at most `max_batch_size`
+    items and resolves each caller's future with its own result. Identical items
+    in the same window share a slot.
+
+    `score_batch(items)` must return a dict {item: result}; items missing from it
+    fail with BatchMiss so the caller can fall back to an unbatched call.
+    """
+
+    def __init__(
+        self,
+        score_batch: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+    ):
+        self.score_batch = score_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: str) -> Any:
+        future = self._pending.get(item)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[item] = loop.create_future()
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        # shield: one caller being cancelled must not cancel the shared slot
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, asyncio.Future]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.score_batch(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for item, future in batch.items():
+            if future.done():
+                continue
+            if item in results:
+                future.set_result(results[item])
+            else:
+                future.set_exception(BatchMiss(item))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,271 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+# --- CONFIG ---
+# CHECKPOINT_BACKEND: "bounded" (default, in memory), "sqlite" (file backed) or "memory" (unbounded)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "bounded")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+MAX_CHECKPOINTS_PER_THREAD = int(os.getenv("CHECKPOINT_MAX_PER_THREAD", "3"))
+IDLE_TTL = float(os.getenv("CHECKPOINT_IDLE_TTL", "3600"))
+MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps only the newest checkpoints of each thread (room),
+    drops rooms idle for longer than `idle_ttl` seconds and evicts the least
+    recently used rooms once the serialized state exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_checkpoints_per_thread: int = MAX_CHECKPOINTS_PER_THREAD,
+        idle_ttl: float = IDLE_TTL,
+        max_bytes: int = MAX_BYTES,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.max_checkpoints_per_thread = max(1, max_checkpoints_per_thread)
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+
+        # thread_id -> last write time, oldest first
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        # (thread_id, ns, checkpoint_id) -> {channel: version} referenced by that checkpoint
+        self._versions: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        # (thread_id, ns) -> blob keys owned by that namespace
+        self._blob_keys: Dict[Tuple[str, str], Set[Tuple]] = defaultdict(set)
+        # approximate serialized size per thread
+        self._thread_bytes: Dict[str, int] = defaultdict(int)
+        self.evicted_threads = 0
+        self.pruned_checkpoints = 0
+
+    # --- WRITE PATH ---
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+
+        added = len(self.storage[thread_id][checkpoint_ns][checkpoint["id"]][0][1])
+        for channel, version in new_versions.items():
+            key = (thread_id, checkpoint_ns, channel, version)
+            self._blob_keys[(thread_id, checkpoint_ns)].add(key)
+            added += len(self.blobs[key][1])
+        self._thread_bytes[thread_id] += added
+        self._versions[(thread_id, checkpoint_ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+
+        self._last_used[thread_id] = time.time()
+        self._last_used.move_to_end(thread_id)
+
+        self._prune_thread(thread_id, checkpoint_ns)
+        self.evict(keep=thread_id)
+        return next_config
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints_per_thread:
+            return
+
+        # checkpoint ids are time-ordered, so the smallest ones are the oldest
+        stale = sorted(checkpoints)[: len(checkpoints) - self.max_checkpoints_per_thread]
+        for checkpoint_id in stale:
+            saved = checkpoints.pop(checkpoint_id)
+            self._thread_bytes[thread_id] -= len(saved[0][1])
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self.pruned_checkpoints += 1
+
+        # Drop channel values no remaining checkpoint points at
+        referenced = set()
+        for checkpoint_id in checkpoints:
+            for channel, version in self._versions.get((thread_id, checkpoint_ns, checkpoint_id), {}).items():
+                referenced.add((thread_id, checkpoint_ns, channel, version))
+        owned = self._blob_keys[(thread_id, checkpoint_ns)]
+        for key in owned - referenced:
+            blob = self.blobs.pop(key, None)
+            if blob is not None:
+                self._thread_bytes[thread_id] -= len(blob[1])
+        owned &= referenced
+
+    # --- EVICTION ---
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Evicts idle threads and, if still over the byte cap, the least recently used ones."""
+        evicted = 0
+        now = time.time()
+        while self._last_used:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if thread_id == keep:
+                break
+            over_ttl = now - last_used > self.idle_ttl
+            over_cap = self.total_bytes() > self.max_bytes
+            if not (over_ttl or over_cap):
+                break
+            self.delete_thread(thread_id)
+            evicted += 1
+        self.evicted_threads += evicted
+        return evicted
+
+    def delete_thread(self, thread_id: str) -> None:
+        namespaces = self.storage.pop(thread_id, {})
+        for checkpoint_ns, checkpoints in namespaces.items():
+            for checkpoint_id in checkpoints:
+                self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+                self._versions.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            for key in self._blob_keys.pop((thread_id, checkpoint_ns), set()):
+                self.blobs.pop(key, None)
+        self._thread_bytes.pop(thread_id, None)
+        self._last_used.pop(thread_id, None)
+
+    # --- STATS ---
+    def total_bytes(self) -> int:
+        return sum(self._thread_bytes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "bounded",
+            "threads": len(self.storage),
+            "checkpoints": sum(len(c) for ns in self.storage.values() for c in ns.values()),
+            "blobs": len(self.blobs),
+            "approx_bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "evicted_threads": self.evicted_threads,
+            "pruned_checkpoints": self.pruned_checkpoints,
+        }
+
+
+def _build_sqlite_saver(path: str, max_checkpoints_per_thread: int, idle_ttl: float) -> BaseCheckpointSaver:
+    """
+    File-backed checkpointer (needs `langgraph-checkpoint-sqlite`). Only the
+    SQLite page cache lives in RAM; per-thread limits and idle eviction are
+    applied on every write, the same as BoundedMemorySaver.
+    """
+    import aiosqlite
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    class BoundedSqliteSaver(AsyncSqliteSaver):
+        def __init__(self):
+            # AsyncSqliteSaver wants a running loop at construction time; the graphs are
+            # compiled at import, so the connection is opened lazily by setup() instead.
+            BaseCheckpointSaver.__init__(self)
+            self.jsonplus_serde = JsonPlusSerializer()
+            self.conn = aiosqlite.connect(path)
+            self.lock = asyncio.Lock()
+            self.loop = None
+            self.is_setup = False
+            self.max_checkpoints_per_thread = max(1, max_checkpoints_per_thread)
+            self.idle_ttl = idle_ttl
+            self.evicted_threads = 0
+            self._last_sweep = 0.0
+
+        async def setup(self) -> None:
+            if self.loop is None:
+                self.loop = asyncio.get_running_loop()
+            was_setup = self.is_setup
+            await super().setup()
+            if not was_setup:
+                async with self.lock:
+                    await self.conn.execute(
+                        "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL)"
+                    )
+                    await self.conn.commit()
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            next_config = await super().aput(config, checkpoint, metadata, new_versions)
+            thread_id = str(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            now = time.time()
+            async with self.lock:
+                await self.conn.execute(
+                    "INSERT OR REPLACE INTO thread_activity (thread_id, last_used) VALUES (?, ?)",
+                    (thread_id, now),
+                )
+                keep = (
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?"
+                )
+                args = (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_checkpoints_per_thread)
+                await self.conn.execute(
+                    f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})", args
+                )
+                await self.conn.execute(
+                    f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN ({keep})", args
+                )
+                await self.conn.commit()
+            # Idle sweep at most once a minute
+            if now - self._last_sweep > 60:
+                self._last_sweep = now
+                await self.aevict()
+            return next_config
+
+        async def aevict(self) -> int:
+            cutoff = time.time() - self.idle_ttl
+            async with self.lock:
+                async with self.conn.execute(
+                    "SELECT thread_id FROM thread_activity WHERE last_used < ?", (cutoff,)
+                ) as cur:
+                    stale = [row[0] for row in await cur.fetchall()]
+            for thread_id in stale:
+                await self.adelete_thread(thread_id)
+                async with self.lock:
+                    await self.conn.execute("DELETE FROM thread_activity WHERE thread_id = ?", (thread_id,))
+                    await self.conn.commit()
+            self.evicted_threads += len(stale)
+            return len(stale)
+
+        async def aclose(self) -> None:
+            if self.is_setup:
+                await self.conn.close()
+                self.is_setup = False
+
+        def stats(self) -> Dict[str, Any]:
+            return {
+                "backend": "sqlite",
+                "path": path,
+                "file_bytes": os.path.getsize(path) if os.path.exists(path) else 0,
+                "evicted_threads": self.evicted_threads,
+            }
+
+    return BoundedSqliteSaver()
+
+
+def build_checkpointer(backend: str = CHECKPOINT_BACKEND) -> BaseCheckpointSaver:
+    if backend == "bounded":
+        return BoundedMemorySaver()
+    if backend == "sqlite":
+        return _build_sqlite_saver(CHECKPOINT_DB, MAX_CHECKPOINTS_PER_THREAD, IDLE_TTL)
+    if backend == "memory":
+        return MemorySaver()
+    raise ValueError(f"Unknown CHECKPOINT_BACKEND: {backend}")
+
+
+def checkpointer_stats(saver: BaseCheckpointSaver) -> Dict[str, Any]:
+    if hasattr(saver, "stats"):
+        return saver.stats()
+    if isinstance(saver, MemorySaver):
+        return {"backend": "memory", "threads": len(saver.storage), "blobs": len(saver.blobs)}
+    return {"backend": type(saver).__name__}
+
+
+async def close_checkpointer(saver: BaseCheckpointSaver) -> None:
+    """Closes file-backed checkpointers (the aiosqlite worker thread keeps the process alive otherwise)."""
+    if hasattr(saver, "aclose"):
+        await saver.aclose()
+
+
+def process_rss_bytes() -> int:
+    """Current resident set size (falls back to peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import sys
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
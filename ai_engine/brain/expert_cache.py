@@ -0,0 +1,111 @@
+import os
+import time
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Type
+from pydantic import BaseModel
+from brain.triage import normalize
+from brain.write_behind import WriteBehind
+
+# --- CONFIG ---
+# EXPERT_CACHE_DB enables the on-disk tier (survives restarts); unset = memory only
+CACHE_ENABLED = os.getenv("EXPERT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_SIZE = int(os.getenv("EXPERT_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("EXPERT_CACHE_TTL", "3600"))
+CACHE_DB = os.getenv("EXPERT_CACHE_DB")
+
+
+class ExpertCache:
+    """
+    LRU + TTL cache of expert scores keyed by (expert, normalized message).
+    Memory is the first tier; an optional SQLite file is the second.
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl_seconds: float = CACHE_TTL, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, BaseModel]]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._disk: Optional[WriteBehind] = None
+        if db_path:
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS expert_cache ("
+                "expert TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (expert, text))"
+            )
+            db.execute("DELETE FROM expert_cache WHERE created < ?", (time.time() - ttl_seconds,))
+            db.commit()
+            self._disk = WriteBehind(
+                db, "INSERT OR REPLACE INTO expert_cache (expert, text, created, value) VALUES (?, ?, ?, ?)"
+            )
+
+    async def get(self, expert: str, message: str, schema: Type[BaseModel]) -> Optional[BaseModel]:
+        key = (expert, normalize(message))
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            created, value = entry
+            if now - created <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self._disk is not None:
+            row = await self._disk.fetchone("SELECT created, value FROM expert_cache WHERE expert = ? AND text = ?", key)
+            if row is not None and now - row[0] <= self.ttl_seconds:
+                value = schema.model_validate_json(row[1])
+                if key not in self._entries:  # a fresh score may have been set during the read
+                    self._remember(key, row[0], value)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def peek(self, expert: str, message: str) -> Optional[BaseModel]:
+        """Memory-tier lookup without touching LRU order or hit/miss counters."""
+        entry = self._entries.get((expert, normalize(message)))
+        if entry is None or time.time() - entry[0] > self.ttl_seconds:
+            return None
+        return entry[1]
+
+    def set(self, expert: str, message: str, value: BaseModel) -> None:
+        key = (expert, normalize(message))
+        created = time.time()
+        self._remember(key, created, value)
+
+        if self._disk is not None:
+            # Written in batches off the event loop; the memory tier already answers this key
+            self._disk.add((key[0], key[1], created, value.model_dump_json()))
+
+    async def flush(self) -> None:
+        if self._disk is not None:
+            await self._disk.flush()
+
+    def _remember(self, key: Tuple[str, str], created: float, value: BaseModel) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+expert_cache = ExpertCache(db_path=CACHE_DB)
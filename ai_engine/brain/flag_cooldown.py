@@ -0,0 +1,113 @@
+import os
+import time
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from brain.write_behind import WriteBehind
+
+# --- CONFIG ---
+# FLAG_COOLDOWN_DB enables the on-disk tier (survives restarts); unset = memory only
+COOLDOWN_ENABLED = os.getenv("FLAG_COOLDOWN_ENABLED", "true").lower() in ("1", "true", "yes")
+COOLDOWN_TTL = float(os.getenv("FLAG_COOLDOWN_TTL", "900"))            # seconds a flag suppresses repeats
+COOLDOWN_ESCALATE_DELTA = float(os.getenv("FLAG_COOLDOWN_ESCALATE_DELTA", "1"))  # score drop that re-flags
+COOLDOWN_MAX_ROUTES = int(os.getenv("FLAG_COOLDOWN_MAX_ROUTES", "50000"))
+COOLDOWN_DB = os.getenv("FLAG_COOLDOWN_DB")
+
+
+class FlagCooldown:
+    """
+    Remembers when each route was last flagged and at which score. A route
+    flagged within `ttl_seconds` is suppressed unless its score got worse by at
+    least `escalate_delta` (lower score = more dangerous), in which case it is
+    flagged again as an escalation.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = COOLDOWN_TTL,
+        escalate_delta: float = COOLDOWN_ESCALATE_DELTA,
+        max_routes: int = COOLDOWN_MAX_ROUTES,
+        db_path: Optional[str] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.escalate_delta = escalate_delta
+        self.max_routes = max_routes
+        self._flags: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # route_id -> (flagged_at, score)
+        self.suppressed = 0
+        self.escalations = 0
+        self.recorded = 0
+
+        self._disk: Optional[WriteBehind] = None
+        if db_path:
+            db = sqlite3.connect(db_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS flag_cooldown ("
+                "route_id TEXT PRIMARY KEY, flagged_at REAL NOT NULL, score REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM flag_cooldown WHERE flagged_at < ?", (time.time() - ttl_seconds,))
+            db.commit()
+            self._disk = WriteBehind(db, "INSERT OR REPLACE INTO flag_cooldown (route_id, flagged_at, score) VALUES (?, ?, ?)")
+
+    async def _last_flag(self, route_id: str, now: float) -> Optional[Tuple[float, float]]:
+        entry = self._flags.get(route_id)
+        if entry is None and self._disk is not None:
+            row = await self._disk.fetchone("SELECT flagged_at, score FROM flag_cooldown WHERE route_id = ?", (route_id,))
+            if row is not None:
+                # A flag recorded while the row was being read is newer than it
+                entry = self._flags.get(route_id) or self._remember(route_id, row[0], row[1])
+        if entry is not None and now - entry[0] > self.ttl_seconds:
+            self._flags.pop(route_id, None)
+            return None
+        return entry
+
+    async def should_flag(self, route_id: str, score: Optional[float]) -> bool:
+        """False while the route is cooling down and has not got worse since its last flag."""
+        entry = await self._last_flag(route_id, time.time())
+        if entry is None:
+            return True
+        return score is not None and score <= entry[1] - self.escalate_delta
+
+    async def filter(self, route_scores: Dict[str, Optional[float]]) -> Tuple[List[str], List[str]]:
+        """Splits {route_id: latest score} into (routes to flag, suppressed routes)."""
+        to_flag, suppressed = [], []
+        for route_id, score in route_scores.items():
+            (to_flag if await self.should_flag(route_id, score) else suppressed).append(route_id)
+        self.suppressed += len(suppressed)
+        return to_flag, suppressed
+
+    async def record(self, route_id: str, score: Optional[float]) -> None:
+        flagged_at = time.time()
+        entry = await self._last_flag(route_id, flagged_at)
+        if entry is not None:
+            self.escalations += 1
+        # Without a score, keep the previous one so later escalations still compare against it
+        if score is None:
+            score = entry[1] if entry is not None else float("inf")
+        self._remember(route_id, flagged_at, score)
+        self.recorded += 1
+
+        if self._disk is not None:
+            # Written in batches off the event loop; the memory tier already holds the flag
+            self._disk.add((route_id, flagged_at, score))
+
+    async def flush(self) -> None:
+        if self._disk is not None:
+            await self._disk.flush()
+
+    def _remember(self, route_id: str, flagged_at: float, score: float) -> Tuple[float, float]:
+        entry = self._flags[route_id] = (flagged_at, score)
+        self._flags.move_to_end(route_id)
+        while len(self._flags) > self.max_routes:
+            self._flags.popitem(last=False)
+        return entry
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "routes_cooling_down": len(self._flags),
+            "recorded": self.recorded,
+            "suppressed": self.suppressed,
+            "escalations": self.escalations,
+        }
+
+
+flag_cooldown = FlagCooldown(db_path=COOLDOWN_DB)
@@ -0,0 +1,168 @@
+import os
+import time
+import asyncio
+import contextlib
+import contextvars
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from brain.metrics import LLM_HEDGES, LLM_HEDGE_WINS
+
+# --- CONFIG ---
+# A hedged call sends a duplicate request once the first one is slower than
+# HEDGE_PERCENTILE of recent calls from the same node, and keeps whichever answers first
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_NODES = {n.strip() for n in os.getenv("HEDGE_NODES", "final_judge,analyzeEmergency").split(",") if n.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "100"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "3000"))  # until HEDGE_MIN_SAMPLES are seen
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "500"))  # recent latencies kept per node
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))  # max share of calls that may send a duplicate
+HEDGE_BURST = float(os.getenv("HEDGE_BURST", "5"))
+
+_node: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("llm_hedge_node", default=None)
+
+
+@contextlib.contextmanager
+def hedged(node: str):
+    """Marks the enclosed LLM calls as belonging to `node`; they are hedged if the node is in HEDGE_NODES."""
+    token = _node.set(node if HEDGE_ENABLED and node in HEDGE_NODES else None)
+    try:
+        yield
+    finally:
+        _node.reset(token)
+
+
+def current_node() -> Optional[str]:
+    return _node.get()
+
+
+class Hedger:
+    """
+    Hedged calls with a cost budget: every call earns `budget` of a credit (up
+    to `burst`) and each duplicate spends one, so at most about `budget` of the
+    calls are ever doubled. The hedge delay is the `percentile` latency of the
+    node's recent calls, so only its slowest tail gets a second request.
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+        default_delay_ms: float = HEDGE_DEFAULT_DELAY_MS,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        window: int = HEDGE_WINDOW,
+        budget: float = HEDGE_BUDGET,
+        burst: float = HEDGE_BURST,
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.default_delay = default_delay_ms / 1000
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = budget
+        self.burst = max(1.0, burst)
+        self._credit = self.burst
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.calls = 0
+        self.hedges = 0
+        self.over_budget = 0
+        self.backup_wins = 0
+
+    def delay(self, node: str) -> float:
+        samples = self._latencies.get(node)
+        if samples is None or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        return max(self.min_delay, ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))])
+
+    def _record(self, node: str, seconds: float) -> None:
+        samples = self._latencies.get(node)
+        if samples is None:
+            samples = self._latencies[node] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    async def _timed(self, node: str, call: Callable[[Callable[[], None]], Awaitable[Any]], sent: asyncio.Event) -> Any:
+        started = None
+
+        def mark_sent() -> None:
+            nonlocal started
+            started = time.perf_counter()
+            sent.set()
+
+        try:
+            # `call` marks when the request actually goes out, so scheduler queueing isn't counted
+            result = await call(mark_sent)
+        except asyncio.CancelledError:
+            if started is not None:
+                # A cancelled loser still ran this long: keep it as a lower bound so the
+                # slow tail doesn't drop out of the samples and drag the delay down
+                self._record(node, time.perf_counter() - started)
+            raise
+        if started is not None:
+            self._record(node, time.perf_counter() - started)
+        return result
+
+    async def run(self, node: str, call: Callable[[Callable[[], None]], Awaitable[Any]]) -> Any:
+        """
+        `call(mark_sent)` makes one request and calls `mark_sent()` once it is
+        actually sent (after any queueing); it may be called twice concurrently.
+        The hedge delay only starts once the first request is sent: a call still
+        waiting for a scheduler slot is never duplicated.
+        """
+        self.calls += 1
+        self._credit = min(self.burst, self._credit + self.budget)
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._timed(node, call, sent))
+        backup = sent_wait = None
+        try:
+            sent_wait = asyncio.ensure_future(sent.wait())
+            await asyncio.wait({primary, sent_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=self.delay(node))
+            if primary.done():
+                LLM_HEDGES.inc(node=node, outcome="not_needed")
+                return primary.result()
+            if self._credit < 1:
+                self.over_budget += 1
+                LLM_HEDGES.inc(node=node, outcome="over_budget")
+                return await primary
+
+            self._credit -= 1
+            self.hedges += 1
+            LLM_HEDGES.inc(node=node, outcome="hedged")
+            backup = asyncio.ensure_future(self._timed(node, call, asyncio.Event()))
+            pending = {primary, backup}
+            winner = primary
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A failed request only decides the outcome when the other one failed too
+                succeeded = [t for t in (primary, backup) if t in done and t.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                    break
+            if winner.exception() is None:
+                if winner is backup:
+                    self.backup_wins += 1
+                LLM_HEDGE_WINS.inc(node=node, winner="backup" if winner is backup else "primary")
+            return winner.result()
+        finally:
+            # The loser (or both, if the caller was cancelled) stops here and frees its slot
+            for task in (primary, backup, sent_wait):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "over_budget": self.over_budget,
+            "backup_wins": self.backup_wins,
+            "hedge_rate": self.hedges / self.calls if self.calls else 0.0,
+            "backup_win_rate": self.backup_wins / self.hedges if self.hedges else 0.0,
+            "credit": round(self._credit, 2),
+            "delay_ms": {node: round(self.delay(node) * 1000, 1) for node in self._latencies},
+        }
+
+
+hedger = Hedger()
@@ -0,0 +1,98 @@
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple
+from brain.triage import is_refusal
+
+# --- CONFIG ---
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "10"))  # messages kept to line up the next request with
+MAX_REFUSALS_KEPT = int(os.getenv("HISTORY_MAX_REFUSALS", "5"))
+MAX_ROOMS = int(os.getenv("HISTORY_DIGEST_MAX_ROOMS", "10000"))
+
+
+class RoomDigest:
+    """
+    Rolling view of one room's chat: the last `window` messages (to line up the
+    next request) plus a compact record of every "Stop"/refusal seen so far,
+    including ones that have already scrolled out of the client's history.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW):
+        self.recent: Deque[Tuple[str, str]] = deque(maxlen=window)
+        self.seen = 0
+        self.refusal_count = 0
+        self.refusals: Deque[Tuple[int, str, str]] = deque(maxlen=MAX_REFUSALS_KEPT)
+        self.refusers: Dict[str, int] = {}
+
+    def update(self, messages: List) -> "RoomDigest":
+        """
+        Consumes only the messages not seen before. The client may send the full
+        history or just a sliding window of the newest messages, so the incoming
+        list is lined up with the stored window by where they overlap.
+        """
+        for m in messages[self._overlap_end(messages):]:
+            self._push(m)
+        return self
+
+    def _overlap_end(self, messages: List) -> int:
+        """
+        Index just past the last message we already saw: the largest p such that
+        messages[:p] ends with the stored window (or, when p is shorter than the
+        window, messages[:p] is the window's tail). 0 if nothing lines up, so a
+        gap or a reset room is read as all-new messages and no refusal is lost.
+        """
+        if not self.recent:
+            return 0
+        keys = [self._key(m) for m in messages]
+        recent = list(self.recent)
+        # Scanning from the end finds the common cases (a retry, one new message) first
+        for p in range(len(keys), 0, -1):
+            n = min(p, len(recent))
+            if keys[p - n:p] == recent[-n:]:
+                return p
+        return 0
+    def _push(self, m) -> None:
+        self.recent.append(self._key(m))
+        self.seen += 1
+        if is_refusal(m.message):
+            self.refusal_count += 1
+            self.refusals.append((self.seen, m.userId, m.message))
+            self.refusers[m.userId] = self.refusers.get(m.userId, 0) + 1
+
+    @staticmethod
+    def _key(m) -> Tuple[str, str]:
+        return (m.userId, m.message)
+
+    def refused_by_others(self, user_id: str) -> bool:
+        return any(u != user_id for u in self.refusers)
+
+    def summary(self) -> str:
+        """Prompt-ready record of every refusal seen in the room, including long-scrolled-out ones ("" if none)."""
+        if not self.refusal_count:
+            return ""
+        lines = [f"(Summary: {self.refusal_count} refusal/'Stop' message(s) in this room so far)"]
+        for index, user_id, text in self.refusals:
+            lines.append(f"  - message #{index} [{user_id}] said: \"{text}\"")
+        return "\n".join(lines)
+
+
+class DigestStore:
+    """Per-room digests with LRU eviction."""
+
+    def __init__(self, max_rooms: int = MAX_ROOMS):
+        self.max_rooms = max_rooms
+        self._rooms: "OrderedDict[str, RoomDigest]" = OrderedDict()
+
+    def update(self, room_id: str, messages: List) -> RoomDigest:
+        digest = self._rooms.get(room_id)
+        if digest is None:
+            digest = self._rooms[room_id] = RoomDigest()
+            while len(self._rooms) > self.max_rooms:
+                self._rooms.popitem(last=False)
+        self._rooms.move_to_end(room_id)
+        return digest.update(messages)
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+
+history_digests = DigestStore()
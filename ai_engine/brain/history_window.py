@@ -0,0 +1,121 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+from brain.expert_cache import expert_cache
+from brain.triage import is_critical, is_refusal
+
+# --- CONFIG ---
+# Token budgets for the chat history put into prompts (estimated at ~4 characters per token)
+# The judge sees about what it used to (the last 10 messages) plus a few older high-risk ones;
+# everything else reaches it through the room digest. Only the emergency prompt gets a long window.
+JUDGE_HISTORY_TOKENS = int(os.getenv("JUDGE_HISTORY_TOKENS", "400"))
+JUDGE_HISTORY_MESSAGES = int(os.getenv("JUDGE_HISTORY_MESSAGES", "10"))   # newest messages
+JUDGE_HISTORY_EXTRAS = int(os.getenv("JUDGE_HISTORY_EXTRAS", "3"))        # older high-risk messages on top
+EMERGENCY_HISTORY_TOKENS = int(os.getenv("EMERGENCY_HISTORY_TOKENS", "1500"))
+RECENT_SHARE = float(os.getenv("HISTORY_RECENT_SHARE", "0.5"))           # budget reserved for the newest messages
+HIGH_RISK_SCORE = float(os.getenv("HISTORY_HIGH_RISK_SCORE", "0.7"))     # cached severity/urgency counted as high
+MAX_MESSAGE_TOKENS = int(os.getenv("HISTORY_MAX_MESSAGE_TOKENS", "120"))  # longer messages are truncated
+# Newest messages considered at all; older refusals reach the judge through the room digest
+SCAN_LIMIT = int(os.getenv("HISTORY_SCAN_LIMIT", "200"))
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _clip(text: str) -> str:
+    limit = MAX_MESSAGE_TOKENS * 4
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def risk(message: str) -> float:
+    """
+    How much a message matters beyond its recency: 1.0 for distress phrases and
+    refusals, otherwise the highest severity/urgency the experts already gave it
+    (from the expert cache; 0.0 if it was never scored).
+    """
+    if is_critical(message) or is_refusal(message):
+        return 1.0
+    scores = []
+    severity = expert_cache.peek("severity", message)
+    urgency = expert_cache.peek("urgency", message)
+    fused = expert_cache.peek("fused", message)
+    if fused is not None:
+        severity, urgency = severity or fused.severity, urgency or fused.urgency
+    if severity is not None:
+        scores.append(severity.severity_score)
+    if urgency is not None:
+        scores.append(urgency.urgency_score)
+    return max(scores, default=0.0)
+
+
+def select(
+    messages: Sequence,
+    budget_tokens: int,
+    max_recent: Optional[int] = None,
+    max_extra: Optional[int] = None,
+) -> List[Tuple[int, str, str]]:
+    """
+    Picks (index, userId, text) entries fitting in `budget_tokens`, in chronological order:
+    1. the newest messages, up to RECENT_SHARE of the budget;
+    2. older high-risk messages, riskiest (then newest) first;
+    3. whatever budget is left goes to the next-newest messages.
+    `max_recent` caps the messages taken by recency (1 + 3) and `max_extra` the
+    high-risk ones (2), so short messages can't fill a budget with a whole room.
+    """
+    start = max(0, len(messages) - SCAN_LIMIT)
+    entries = [(i, m.userId, _clip(m.message)) for i, m in enumerate(messages[start:], start)]
+    cost = {i: estimate_tokens(f"[{u}]: {t}") for i, u, t in entries}
+    chosen = set()
+    used = 0
+    recent = 0
+
+    def take(candidates, limit) -> None:
+        nonlocal used, recent
+        for i, _, _ in candidates:
+            if i in chosen:
+                continue
+            if used + cost[i] > limit or (max_recent is not None and recent >= max_recent):
+                break
+            chosen.add(i)
+            used += cost[i]
+            recent += 1
+
+    newest_first = entries[::-1]
+    take(newest_first, budget_tokens * RECENT_SHARE)
+
+    older = [e for e in newest_first if e[0] not in chosen]
+    risky = [(r, e) for e in older if (r := risk(e[2])) >= HIGH_RISK_SCORE]
+    risky.sort(key=lambda item: (-item[0], -item[1][0]))
+    if max_extra is not None:
+        risky = risky[:max_extra]
+    for _, e in risky:
+        # Unlike the recency pass, a long risky message doesn't stop smaller ones from fitting
+        if used + cost[e[0]] <= budget_tokens:
+            chosen.add(e[0])
+            used += cost[e[0]]
+
+    take(newest_first, budget_tokens)
+    return [e for e in entries if e[0] in chosen]
+
+
+def render(
+    messages: Sequence,
+    budget_tokens: int,
+    empty: str = "No recent chat history.",
+    max_recent: Optional[int] = None,
+    max_extra: Optional[int] = None,
+) -> str:
+    """Prompt-ready history under the budget, with markers where messages were left out."""
+    if not messages:
+        return empty
+    lines = []
+    previous = -1
+    for index, user_id, text in select(messages, budget_tokens, max_recent, max_extra):
+        skipped = index - previous - 1
+        if skipped:
+            lines.append(f"(... {skipped} message(s) omitted ...)")
+        lines.append(f"[{user_id}]: {text}")
+        previous = index
+    if len(messages) - previous - 1:
+        lines.append(f"(... {len(messages) - previous - 1} message(s) omitted ...)")
+    return "\n".join(lines)
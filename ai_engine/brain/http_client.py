@@ -0,0 +1,38 @@
+import os
+import asyncio
+from typing import Optional
+import httpx
+
+# --- CONFIG ---
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:3000")
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Shared AsyncClient for calls to the Node backend: keep-alive connections
+    are pooled across requests instead of opening a TCP connection per call.
+    A pool is bound to the loop it was created on, so a new loop gets a new client.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            timeout=BACKEND_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client, _client_loop = None, None
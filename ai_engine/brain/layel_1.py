@@ -1,24 +1,31 @@
 import os
+import logging
 from typing import List, Optional, TypedDict, Annotated
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
 from langgraph.graph import END, START, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
-
-load_dotenv()
-
-if not os.getenv("GOOGLE_API_KEY"):
-    raise ValueError("GOOGLE_API_KEY not found! Please check your ai_engine/.env file.")
+from brain.llm_provider import get_chat_model
+from brain.checkpoint import build_checkpointer
+from brain import triage
+from brain.expert_cache import expert_cache, CACHE_ENABLED
+from brain.history_digest import history_digests
+from brain import history_window
+from brain.history_window import JUDGE_HISTORY_TOKENS, JUDGE_HISTORY_MESSAGES, JUDGE_HISTORY_EXTRAS
+from brain import aggregator
+from brain.batching import MicroBatcher, BATCH_ENABLED
+from brain.metrics import timed_node, log_event
+from brain.hedging import hedged
+from brain.schemas import FrontendMessage
 
 # --- 1. SETUP MODELS ---
-flash_model = ChatGoogleGenerativeAI(
+# Built through the provider so LLM_MODE=record/replay works offline (see brain/llm_provider.py).
+# Both share one lazily built Gemini client; nothing connects until the first call.
+flash_model = get_chat_model(
     model="gemini-2.0-flash",
     temperature=0, 
     max_retries=2,
 )
 
-pro_model = ChatGoogleGenerativeAI(
+pro_model = get_chat_model(
     model="gemini-2.0-flash", # Using Pro for the heavy lifting of context analysis
     temperature=0,
 )
@@ -40,11 +47,21 @@ class FinalScore(BaseModel):
     final_safety_score: float = Field(description="Integer-like float 1.0 to 10.0")
     reason: str = Field(description="Detailed verdict citing history and current threats")
 
-# --- 3. STATE DEFINITIONS ---
-class FrontendMessage(BaseModel):
-    userId: str
-    message: str
+class FusedExpertScores(BaseModel):
+    sentiment: SentimentScore = Field(description="Emotional tone of the target message")
+    urgency: UrgencyScore = Field(description="Need for immediate intervention")
+    severity: SeverityScore = Field(description="Nature of the threat in the message")
+
+class BatchItemScores(BaseModel):
+    index: int = Field(description="Index of the message in the input list")
+    sentiment: SentimentScore
+    urgency: UrgencyScore
+    severity: SeverityScore
 
+class BatchExpertScores(BaseModel):
+    results: List[BatchItemScores] = Field(description="One entry per input message")
+
+# --- 3. STATE DEFINITIONS ---
 class GraphState(TypedDict):
     roomId: str
     messages: List[FrontendMessage] # Full history from frontend
@@ -61,9 +78,137 @@ sentiment_engine = flash_model.with_structured_output(SentimentScore)
 urgency_engine = flash_model.with_structured_output(UrgencyScore)
 severity_engine = flash_model.with_structured_output(SeverityScore)
 final_engine = pro_model.with_structured_output(FinalScore)
+fused_engine = flash_model.with_structured_output(FusedExpertScores)
+batch_engine = flash_model.with_structured_output(BatchExpertScores)
+
+GRAPH_MODE = os.getenv("AGENT1_GRAPH_MODE", "parallel")
 
 # --- 5. WORKER NODES (Specialized & Efficient) ---
 
+# Opt-in micro-batching: expert requests from concurrent rooms share one structured-output call
+async def score_batch(messages: List[str]):
+    listing = "\n".join(f'    [{i}] "{m}"' for i, m in enumerate(messages))
+    prompt = f"""
+    ROLE: Safety Analysis Panel (Sentiment Analyst, Emergency Dispatcher, Threat Specialist).
+    TASK: Score EACH message below independently on three axes. Do not let messages influence each other.
+    
+    MESSAGES:
+{listing}
+    
+    1. SENTIMENT (emotion only): 0.0 = Hostile, 0.5 = Neutral, 1.0 = Friendly.
+    2. URGENCY: 0.0 = Casual, 0.5 = Uncomfortable (e.g., "Stop texting me"), 1.0 = CRITICAL ("He is following me", "Call police").
+    3. SEVERITY: 0.0 = Safe, 0.3 = Annoying / Spam, 0.7 = Harassment / Stalking / Slurs, 1.0 = Threat of Violence / Kidnapping / Rape.
+    
+    OUTPUT: one result per message, with its index, a score and a short reason for each axis.
+    """
+    result = await batch_engine.ainvoke(prompt)
+    return {
+        messages[r.index]: FusedExpertScores(sentiment=r.sentiment, urgency=r.urgency, severity=r.severity)
+        for r in result.results
+        if 0 <= r.index < len(messages)
+    }
+
+expert_batcher = MicroBatcher(score_batch)
+
+# Expert scores depend only on the message text, so repeats skip the LLM
+async def cached_expert(expert: str, schema, engine, msg: str, prompt: str):
+    if CACHE_ENABLED:
+        cached = await expert_cache.get(expert, msg, schema)
+        if cached is not None:
+            return cached
+
+    result = None
+    if BATCH_ENABLED:
+        try:
+            fused = await expert_batcher.submit(msg)
+            result = fused if expert == "fused" else getattr(fused, expert)
+            if CACHE_ENABLED:
+                expert_cache.set("fused", msg, fused)
+                for part in ("sentiment", "urgency", "severity"):
+                    expert_cache.set(part, msg, getattr(fused, part))
+        except Exception as e:
+            log_event("batched_scoring_failed", level=logging.WARNING, expert=expert, error=str(e))
+
+    if result is None:
+        result = await engine.ainvoke(prompt)
+        if CACHE_ENABLED:
+            expert_cache.set(expert, msg, result)
+    return result
+
+# Local rule-based tier: decides trivially safe / obviously critical messages without the LLM
+def triage_scores(message: str, verdict: dict) -> dict:
+    rule = verdict["rule"]
+    if verdict["verdict"] == "safe":
+        return {
+            "model_1": SentimentScore(sentiment_score=0.7, reason=f"Triage: small talk ({rule})"),
+            "model_2": UrgencyScore(urgency_score=0.0, reason="Triage: no time pressure"),
+            "model_3": SeverityScore(severity_score=0.0, reason="Triage: safe phrase"),
+            "final_model_score": FinalScore(
+                final_safety_score=10.0,
+                reason=f"Rule-based triage: '{message}' is a standard safe message.",
+            ),
+        }
+
+    return {
+        "model_1": SentimentScore(sentiment_score=0.1, reason="Triage: distress language"),
+        "model_2": UrgencyScore(urgency_score=1.0, reason=f"Triage: trigger phrase matched ({rule})"),
+        "model_3": SeverityScore(severity_score=0.8, reason="Triage: explicit request for help"),
+        "final_model_score": FinalScore(
+            final_safety_score=2.0,
+            reason=f"Rule-based triage: distress phrase detected in '{message}'. Escalate immediately.",
+        ),
+    }
+
+async def triage_node(state: GraphState):
+    digest = history_digests.update(state["roomId"], state["messages"])
+    verdict = triage.classify(state["currentUserMessage"], digest.refused_by_others(state["currentUserId"]))
+    if verdict is None:
+        return {"final_model_score": None}
+    return triage_scores(state["currentUserMessage"], verdict)
+
+def degraded_scores(state: GraphState) -> dict:
+    """
+    Local stand-in for the graph when the service is overloaded: triage rules,
+    then any expert scores already cached for the message, then a cautious
+    default, combined by the aggregator. No LLM call is made.
+    """
+    msg = state["currentUserMessage"]
+    digest = history_digests.update(state["roomId"], state["messages"])
+    refused = digest.refused_by_others(state["currentUserId"])
+    verdict = triage.classify(msg, refused)
+    if verdict is not None:
+        return triage_scores(msg, verdict)
+
+    fused = expert_cache.peek("fused", msg)
+    sentiment = expert_cache.peek("sentiment", msg) or (fused and fused.sentiment)
+    urgency = expert_cache.peek("urgency", msg) or (fused and fused.urgency)
+    severity = expert_cache.peek("severity", msg) or (fused and fused.severity)
+    source = "cached expert scores" if sentiment and urgency and severity else "default risk"
+    # Someone else in the room said stop: assume the worse case until the judge can look
+    default_risk = 0.6 if refused else 0.3
+    sentiment = sentiment or SentimentScore(sentiment_score=0.5, reason="Degraded: not scored")
+    urgency = urgency or UrgencyScore(urgency_score=default_risk, reason="Degraded: not scored")
+    severity = severity or SeverityScore(severity_score=default_risk, reason="Degraded: not scored")
+
+    agg = aggregator.aggregate(sentiment.sentiment_score, urgency.urgency_score, severity.severity_score)
+    return {
+        "model_1": sentiment,
+        "model_2": urgency,
+        "model_3": severity,
+        "final_model_score": FinalScore(
+            final_safety_score=agg.score,
+            reason=f"Degraded mode (service overloaded): heuristic score from {source}; re-check when load drops.",
+        ),
+    }
+
+def route_after_triage(state: GraphState):
+    if state["final_model_score"] is not None:
+        return END
+    return ["analyze_sentiment", "analyze_urgency", "analyze_severity"]
+
+def route_after_triage_fused(state: GraphState):
+    return END if state["final_model_score"] is not None else "analyze_fused"
+
 # Changed to 'async def' and 'await ... .ainvoke()'
 async def analyze_sentiment(state: GraphState):
     msg = state["currentUserMessage"]
@@ -81,7 +226,7 @@ async def analyze_sentiment(state: GraphState):
     
     OUTPUT: Provide a precise float score and a 5-word explanation.
     """
-    result = await sentiment_engine.ainvoke(prompt)
+    result = await cached_expert("sentiment", SentimentScore, sentiment_engine, msg, prompt)
     return {"model_1": result}
 
 # Changed to 'async def' and 'await ... .ainvoke()'
@@ -101,7 +246,7 @@ async def analyze_urgency(state: GraphState):
     
     OUTPUT: specific urgency_score and reason.
     """
-    result = await urgency_engine.ainvoke(prompt)
+    result = await cached_expert("urgency", UrgencyScore, urgency_engine, msg, prompt)
     return {"model_2": result}
 
 # Changed to 'async def' and 'await ... .ainvoke()'
@@ -121,16 +266,83 @@ async def analyze_severity(state: GraphState):
     
     OUTPUT: specific severity_score and reason.
     """
-    result = await severity_engine.ainvoke(prompt)
+    result = await cached_expert("severity", SeverityScore, severity_engine, msg, prompt)
     return {"model_3": result}
 
+# One call that returns all three expert reports (used by the "fused" graph)
+async def analyze_fused(state: GraphState):
+    msg = state["currentUserMessage"]
+    prompt = f"""
+    ROLE: Safety Analysis Panel (Sentiment Analyst, Emergency Dispatcher, Threat Specialist).
+    TASK: Score the target message on three independent axes.
+    
+    TARGET MESSAGE: "{msg}"
+    
+    1. SENTIMENT (emotion only, ignore safety):
+    - 0.0 = Extremely Negative (Angry, Hateful, Hostile, Disgusted).
+    - 0.5 = Neutral (Factual, Questioning, Bored).
+    - 1.0 = Extremely Positive (Happy, Grateful, Excited).
+    
+    2. URGENCY (does it need IMMEDIATE intervention?):
+    - Look for "trigger words": Help, Police, Now, Scared, Followed, Location.
+    - 0.0 = Casual conversation (No time pressure).
+    - 0.5 = Uncomfortable but not immediate (e.g., "Stop texting me").
+    - 1.0 = CRITICAL EMERGENCY (e.g., "He is following me", "Call police").
+    
+    3. SEVERITY (nature of the threat):
+    - 0.0 = Safe / Friendly.
+    - 0.3 = Annoying / Spam / Unwanted attention.
+    - 0.7 = Sexual Harassment / Stalking / Explicit Slurs.
+    - 1.0 = Direct Threat of Violence / Kidnapping / Rape.
+    
+    OUTPUT: a score and a short reason for each axis.
+    """
+    result = await cached_expert("fused", FusedExpertScores, fused_engine, msg, prompt)
+    return {
+        "model_1": result.sentiment,
+        "model_2": result.urgency,
+        "model_3": result.severity,
+    }
+
+# Deterministic aggregation: when the experts agree, their weighted score is final
+async def aggregate_scores(state: GraphState):
+    p = aggregator.policy
+    if not p.enabled:
+        return {"final_model_score": None}
+
+    # A "Stop" from someone else in the room needs the judge's history check
+    digest = history_digests.update(state["roomId"], state["messages"])
+    if digest.refused_by_others(state["currentUserId"]):
+        return {"final_model_score": None}
+
+    s, u, sev = state["model_1"], state["model_2"], state["model_3"]
+    agg = aggregator.aggregate(s.sentiment_score, u.urgency_score, sev.severity_score, p)
+    if agg.band is None:
+        return {"final_model_score": None}
+
+    return {
+        "final_model_score": FinalScore(
+            final_safety_score=agg.score,
+            reason=(
+                f"Expert consensus ({agg.band}, confidence {agg.confidence:.2f}): "
+                f"urgency {u.urgency_score} ({u.reason}), severity {sev.severity_score} ({sev.reason}). Judge skipped."
+            ),
+        )
+    }
+
+def route_after_aggregate(state: GraphState):
+    return END if state["final_model_score"] is not None else "final_judge"
+
 # --- 6. THE FINAL JUDGE (With Memory Context) ---
 
 # Changed to 'async def' and 'await ... .ainvoke()'
 async def final_judge(state: GraphState):
-    # 1. Extract & Format History (Last 10 messages for efficiency)
-    raw_history = state["messages"][-10:] 
-    history_str = "\n".join([f"[{m.userId}]: {m.message}" for m in raw_history])
+    # 1. History: every refusal the room has seen (kept incrementally by the digest),
+    # then the newest messages plus older high-risk ones, under a token budget
+    digest = history_digests.update(state["roomId"], state["messages"])
+    window = history_window.render(state["messages"], JUDGE_HISTORY_TOKENS,
+                                   max_recent=JUDGE_HISTORY_MESSAGES, max_extra=JUDGE_HISTORY_EXTRAS)
+    history_str = f"{digest.summary()}\n{window}" if digest.refusal_count else window
     
     # 2. Extract Current Data
     current_msg = state["currentUserMessage"]
@@ -195,28 +407,70 @@ async def final_judge(state: GraphState):
        - Output a precise score and a detailed explanation citing specific messages from history if relevant.
     """
     
-    result = await final_engine.ainvoke(prompt)
+    with hedged("final_judge"):
+        result = await final_engine.ainvoke(prompt)
     return {"final_model_score": result}
 
 # --- 7. COMPILE GRAPH ---
 graph = StateGraph(GraphState)
 
-graph.add_node("analyze_sentiment", analyze_sentiment)
-graph.add_node("analyze_urgency", analyze_urgency)
-graph.add_node("analyze_severity", analyze_severity)
-graph.add_node("final_judge", final_judge)
+graph.add_node("triage", timed_node("agent1", "triage", triage_node))
+graph.add_node("analyze_sentiment", timed_node("agent1", "analyze_sentiment", analyze_sentiment))
+graph.add_node("analyze_urgency", timed_node("agent1", "analyze_urgency", analyze_urgency))
+graph.add_node("analyze_severity", timed_node("agent1", "analyze_severity", analyze_severity))
+graph.add_node("aggregate", timed_node("agent1", "aggregate", aggregate_scores))
+graph.add_node("final_judge", timed_node("agent1", "final_judge", final_judge))
 
-# Parallel execution
-graph.add_edge(START, "analyze_sentiment")
-graph.add_edge(START, "analyze_urgency")
-graph.add_edge(START, "analyze_severity")
+# Rule-based triage first, then parallel execution when the rules can't decide
+graph.add_edge(START, "triage")
+graph.add_conditional_edges(
+    "triage",
+    route_after_triage,
+    ["analyze_sentiment", "analyze_urgency", "analyze_severity", END],
+)
 
-# Aggregation
-graph.add_edge("analyze_sentiment", "final_judge")
-graph.add_edge("analyze_urgency", "final_judge")
-graph.add_edge("analyze_severity", "final_judge")
+# Aggregation: local consensus check, judge only when the experts disagree
+graph.add_edge("analyze_sentiment", "aggregate")
+graph.add_edge("analyze_urgency", "aggregate")
+graph.add_edge("analyze_severity", "aggregate")
+graph.add_conditional_edges("aggregate", route_after_aggregate, ["final_judge", END])
 
 graph.add_edge("final_judge", END)
 
-memory = MemorySaver()
-app_graph = graph.compile(checkpointer=memory)
\ No newline at end of file
+# Bounded per room (see CHECKPOINT_* env vars) so idle rooms don't stay in RAM forever
+memory = build_checkpointer()
+
+# Fused variant: one expert call, judge only when the panel disagrees
+fused_graph = StateGraph(GraphState)
+
+fused_graph.add_node("triage", timed_node("agent1_fused", "triage", triage_node))
+fused_graph.add_node("analyze_fused", timed_node("agent1_fused", "analyze_fused", analyze_fused))
+fused_graph.add_node("aggregate", timed_node("agent1_fused", "aggregate", aggregate_scores))
+fused_graph.add_node("final_judge", timed_node("agent1_fused", "final_judge", final_judge))
+
+fused_graph.add_edge(START, "triage")
+fused_graph.add_conditional_edges("triage", route_after_triage_fused, ["analyze_fused", END])
+fused_graph.add_edge("analyze_fused", "aggregate")
+fused_graph.add_conditional_edges("aggregate", route_after_aggregate, ["final_judge", END])
+fused_graph.add_edge("final_judge", END)
+
+# Compiled on first use
+CHAT_GRAPHS = {"parallel": graph, "fused": fused_graph}
+_compiled_graphs = {}
+
+def get_chat_graph(mode: Optional[str] = None):
+    """Returns the compiled chat graph for 'parallel' (default) or 'fused' mode."""
+    mode = mode or GRAPH_MODE
+    if mode not in CHAT_GRAPHS:
+        raise ValueError(f"Unknown agent1 graph mode: {mode}")
+    if mode not in _compiled_graphs:
+        _compiled_graphs[mode] = CHAT_GRAPHS[mode].compile(checkpointer=memory)
+    return _compiled_graphs[mode]
+
+def __getattr__(name):
+    # Old module attributes, now compiled lazily
+    if name == "app_graph":
+        return get_chat_graph("parallel")
+    if name == "fused_app_graph":
+        return get_chat_graph("fused")
+    raise AttributeError(name)
@@ -1,69 +1,136 @@
 import os
-import requests
 import json
-from typing import List, Dict, TypedDict, Annotated
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage
+import asyncio
+import operator
+import logging
+import time
+from typing import List, Dict, Optional, TypedDict, Annotated
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, ToolMessage, AIMessage
 from langchain_core.tools import tool
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
-from dotenv import load_dotenv
-
-load_dotenv()
+from brain.llm_provider import get_chat_model
+from brain.llm_scheduler import llm_priority, SURVEILLANCE
+from brain import route_rules
+from brain.http_client import get_http_client
+from brain.flag_cooldown import flag_cooldown, COOLDOWN_ENABLED
+from brain.metrics import BACKEND_SECONDS, TOOL_CALLS, timed_node, log_event
 
 # --- 1. DEFINE THE TOOL ---
+FLAG_PAYLOAD = {"severity": "HIGH", "ai_reason": "Automated surveillance flag by AI Agent"}
+# One /flag-rooms request per scan instead of one /flag-room request per route
+BULK_FLAG_ENABLED = os.getenv("SURVEILLANCE_BULK_FLAG", "true").lower() in ("1", "true", "yes")
+
 @tool
-def flag_suspicious_route(route_id: str):
+async def flag_suspicious_route(route_id: str):
     """
     Triggers a backend alert for a specific route ID. 
     Use this tool when a route's score pattern indicates danger.
     Args:
         route_id: The ID of the suspicious route.
     """
+    started = time.perf_counter()
     try:
-        # Calls your Node.js/FastAPI backend
-        backend_url = os.getenv("BACKEND_URL", "http://localhost:3000")
-        endpoint = f"{backend_url}/api/room/flag-room"
-        
-        payload = {
-            "roomId": route_id,
-            "severity": "HIGH",
-            "ai_reason": "Automated surveillance flag by AI Agent"
-        }
-        
-        # Requests is synchronous, so using 'def' is the correct way.
-        response = requests.post(endpoint, json=payload, timeout=5)
+        # Calls your Node.js backend over the shared keep-alive pool
+        response = await get_http_client().post("/api/room/flag-room", json={"roomId": route_id, **FLAG_PAYLOAD})
+        BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint="flag-room", outcome=response.status_code)
         return f"ALARM TRIGGERED for {route_id}. Status: {response.status_code}"
             
     except Exception as e:
+        BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint="flag-room", outcome="error")
         return f"FAILED to trigger alarm for {route_id}: {str(e)}"
+
+async def flag_routes(route_ids: List[str]) -> Dict[str, str]:
+    """
+    Flags many routes with a single bulk request. Returns {route_id: result} in
+    the same wording as the tool; falls back to concurrent single flags when the
+    bulk route is unavailable.
+    """
+    started = time.perf_counter()
+    try:
+        response = await get_http_client().post(
+            "/api/room/flag-rooms",
+            json={"rooms": [{"roomId": r, **FLAG_PAYLOAD} for r in route_ids]},
+        )
+        BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint="flag-rooms", outcome=response.status_code)
+        if response.status_code == 200:
+            return {r: f"ALARM TRIGGERED for {r}. Status: {response.status_code}" for r in route_ids}
+        log_event("bulk_flag_fallback", level=logging.WARNING, routes=len(route_ids), status=response.status_code)
+    except Exception as e:
+        BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint="flag-rooms", outcome="error")
+        log_event("bulk_flag_fallback", level=logging.WARNING, routes=len(route_ids), error=str(e))
+
+    results = await asyncio.gather(*(flag_suspicious_route.ainvoke({"route_id": r}) for r in route_ids))
+    return dict(zip(route_ids, results))
+
+def flag_succeeded(result: str) -> bool:
+    return result.startswith("ALARM TRIGGERED") and result.endswith("Status: 200")
+
+def latest_score(data: Dict[str, List[float]], route_id: str):
+    scores = data.get(route_id)
+    return scores[-1] if scores else None
+
+async def send_flags(route_ids: List[str], data: Dict[str, List[float]]):
+    """
+    Flags the routes (one bulk request when there are several), records each
+    success in the flag cooldown and returns ({route_id: result}, flagged_ids).
+    """
+    by_route = {}
+    if BULK_FLAG_ENABLED and len(route_ids) > 1:
+        by_route.update(await flag_routes(route_ids))
+    elif route_ids:
+        results = await asyncio.gather(*(flag_suspicious_route.ainvoke({"route_id": r}) for r in route_ids))
+        by_route.update(zip(route_ids, results))
+
+    flagged = []
+    for route_id in route_ids:
+        if flag_succeeded(by_route[route_id]):
+            flagged.append(route_id)
+            await flag_cooldown.record(route_id, latest_score(data, route_id))
+    TOOL_CALLS.inc(len(flagged), tool="flag_suspicious_route", outcome="flagged")
+    TOOL_CALLS.inc(len(route_ids) - len(flagged), tool="flag_suspicious_route", outcome="failed")
+    return by_route, flagged
+
 # --- 2. STATE DEFINITION ---
 class SurveillanceState(TypedDict):
     # This is the INPUT data (The Dictionary)
     route_data: Dict[str, List[float]]
     # This is the INTERNAL scratchpad (UserMsg -> AI -> Tool -> ToolMsg ...)
     messages: Annotated[List[BaseMessage], add_messages]
+    # Routes actually flagged / skipped because of the flag cooldown during this scan
+    flagged_routes: Annotated[List[str], operator.add]
+    suppressed_routes: Annotated[List[str], operator.add]
 
 # --- 3. MODEL SETUP ---
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+llm = get_chat_model(model="gemini-2.0-flash", temperature=0)
 llm_with_tools = llm.bind_tools([flag_suspicious_route])
 
 # --- 4. NODES ---
 
 # ... inside layel_2.py ...
 
-async def analyst_node(state: SurveillanceState):
-    """
-    The Brain: Looks at 'route_data' and decides if tools are needed.
-    """
-    print("\n--- 🧠 ANALYST NODE STARTED ---")
-    data = state["route_data"]
-    messages = state["messages"]
-    
-    # 1. INITIALIZATION: If no messages exist, we must start the conversation
-    if not messages:
-        print("🔹 Mode: Initialization (Creating Prompt)")
-        prompt_content = f"""
+def flagged_routes_prompt(flagged: Dict[str, Dict], results: Dict[str, str]) -> str:
+    return f"""
+        These routes MATCH the danger criteria (computed locally from their score history):
+        {json.dumps(flagged)}
+
+        Backend alerts have already been sent for them:
+        {json.dumps(results)}
+
+        --- THE SAFETY RUBRIC (Reference) ---
+        [9-10] SAFE (Green): Friendly banter, logistics.
+        [7-8]  CAUTION (Yellow): Rude, weird vibes.
+        [4-6]  UNSAFE (Orange): Harassment, "Stop" ignored, Stalking.
+        [1-3]  DANGER (Red): Threats, SOS, Violence.
+
+        FIELDS: latest = newest score, max_recent_drop = biggest recent drop, rolling_mean = mean of the last scores.
+
+        ACTION: Briefly explain, per route, why it is dangerous using the rubric.
+        Mention any route whose alert FAILED.
+        """
+
+def full_scan_prompt(data: Dict[str, List[float]]) -> str:
+    return f"""
         Analyze this Route Safety Data: {json.dumps(data)}
 
         --- THE SAFETY RUBRIC (Reference) ---
@@ -83,25 +150,65 @@ async def analyst_node(state: SurveillanceState):
            - If multiple routes are bad, call the tool for EACH one.
         5. If all are safe, simply respond "Surveillance Clean".
         """
-        
+
+async def analyst_node(state: SurveillanceState):
+    """
+    The Brain: Looks at 'route_data' and decides if tools are needed.
+    """
+    data = state["route_data"]
+    messages = state["messages"]
+
+    # 1. INITIALIZATION: If no messages exist, we must start the conversation
+    if not messages:
+        if route_rules.LOCAL_RULES_ENABLED:
+            suppressed = []
+            # The danger criteria are plain arithmetic: evaluate them locally and
+            # hand the LLM only the matching routes (or nothing when all are clean).
+            flagged = route_rules.evaluate(data)
+            log_event("local_rules", routes=len(data), matched=len(flagged))
+            if COOLDOWN_ENABLED and flagged:
+                # Routes flagged recently that have not got worse need no new alert
+                active, suppressed = await flag_cooldown.filter({r: f["latest"] for r, f in flagged.items()})
+                flagged = {r: flagged[r] for r in active}
+                log_event("flag_cooldown", active=len(active), suppressed=len(suppressed))
+            TOOL_CALLS.inc(len(suppressed), tool="flag_suspicious_route", outcome="suppressed")
+            if not flagged:
+                scan = HumanMessage(content=f"Local danger-criteria scan of {len(data)} routes")
+                report = "Surveillance Clean" if not suppressed else \
+                    f"Surveillance: {len(suppressed)} dangerous routes already flagged recently, no new alerts"
+                return {"messages": [scan, AIMessage(content=report)], "suppressed_routes": suppressed}
+
+            # The matching routes are known exactly, so they are flagged here rather than
+            # left to the model's tool calls; the LLM only writes the explanation
+            log_event("flagging_routes", sampled=False, routes=list(flagged), suppressed=suppressed)
+            results, sent = await send_flags(list(flagged), data)
+            first_message = HumanMessage(content=flagged_routes_prompt(flagged, results))
+            try:
+                response = await llm.ainvoke([first_message])
+            except Exception as e:
+                log_event("analyst_explanation_failed", level=logging.WARNING, error=str(e))
+                response = AIMessage(content="Flagged by danger criteria: " + ", ".join(
+                    f"{r} ({results[r]})" for r in flagged))
+            return {"messages": [first_message, response], "flagged_routes": sent, "suppressed_routes": suppressed}
+
+        prompt_content = full_scan_prompt(data)
+
         # Create the prompt object
         first_message = HumanMessage(content=prompt_content)
-        
+
         # ⚠️ CRITICAL STEP: Invoke the LLM *IMMEDIATELY* with this new message
-        print("🔹 Invoking LLM with initial prompt...")
         response = await llm_with_tools.ainvoke([first_message])
-        
-        print(f"🔹 LLM Response Generated. Tool Calls: {response.tool_calls}")
-        
+
+        log_event("analyst_response", mode="initial", tool_calls=len(response.tool_calls))
+
         # ⚠️ CRITICAL RETURN: We must return BOTH the prompt AND the response
         # This ensures the Router sees the AI's response as the last message.
         return {"messages": [first_message, response]}
-    
+
     # 2. CONTINUATION: If messages exist (e.g., looping back from a tool)
-    print("🔹 Mode: Continuation (History exists)")
     response = await llm_with_tools.ainvoke(state["messages"])
-    print(f"🔹 LLM Response Generated. Tool Calls: {response.tool_calls}")
-    
+    log_event("analyst_response", mode="continuation", tool_calls=len(response.tool_calls))
+
     return {"messages": [response]}
 
 
@@ -126,67 +233,61 @@ async def tool_node(state: SurveillanceState):
             "id": "legacy_call" 
         }]
 
-    # 3. Execute Loop
-    if tool_calls:
-        for tool_call in tool_calls:
-            if tool_call["name"] == "flag_suspicious_route":
-                print(f"🚨 FLAGGING ROUTE: {tool_call['args']['route_id']}")
-                
-                # Since we changed the tool to 'def' (sync), .ainvoke handles the thread automatically.
-                # This is much safer than before.
-                result = await flag_suspicious_route.ainvoke(tool_call)
-                
-                tool_outputs.append(
-                    ToolMessage(
-                        content=str(result),
-                        tool_call_id=tool_call["id"],
-                        name=tool_call["name"]
-                    )
+    # 3. Execute all calls concurrently (or as one bulk request), keeping each
+    #    result attached to the tool_call_id it answers
+    flag_calls = [tc for tc in tool_calls if tc["name"] == "flag_suspicious_route"]
+    flagged, suppressed = [], []
+    if flag_calls:
+        route_ids = list(dict.fromkeys(tc["args"]["route_id"] for tc in flag_calls))
+        to_flag = route_ids
+        if COOLDOWN_ENABLED:
+            to_flag, suppressed = await flag_cooldown.filter({r: latest_score(state["route_data"], r) for r in route_ids})
+        log_event("flagging_routes", sampled=False, routes=to_flag, suppressed=suppressed)
+
+        by_route = {r: f"SUPPRESSED: {r} was already flagged recently and its score has not got worse." for r in suppressed}
+        results, flagged = await send_flags(to_flag, state["route_data"])
+        by_route.update(results)
+        TOOL_CALLS.inc(len(suppressed), tool="flag_suspicious_route", outcome="suppressed")
+
+        for tool_call in flag_calls:
+            tool_outputs.append(
+                ToolMessage(
+                    content=str(by_route[tool_call["args"]["route_id"]]),
+                    tool_call_id=tool_call["id"],
+                    name=tool_call["name"]
                 )
+            )
     else:
-        print("⚠️ Tool Node ran but found no tool calls to execute!")
+        log_event("tool_node_without_calls", level=logging.WARNING)
     
-    return {"messages": tool_outputs}
+    return {"messages": tool_outputs, "flagged_routes": flagged, "suppressed_routes": suppressed}
 # --- 5. LOGIC & EDGES ---
 
 async def router(state: SurveillanceState):
     """
-    Router with Debugging to fix the 'Silent Failure'
+    Routes to the tools node when the analyst asked for tool calls.
     """
     messages = state["messages"]
     last_message = messages[-1]
     
-    # 🔍 DEBUGGING: Print exactly what the Router sees
-    print("\n--- 🧐 ROUTER DIAGNOSTICS ---")
-    print(f"Message Type: {type(last_message)}")
-    print(f"Message Content: {last_message.content[:50]}...") # Print first 50 chars
-    
     # Check for tool_calls safely
     tool_calls = getattr(last_message, "tool_calls", [])
-    print(f"Tool Calls Found: {tool_calls}")
 
     # 1. Check standard tool_calls (New LangChain standard)
-    if tool_calls and len(tool_calls) > 0:
-        print("✅ DECISION: Routing to 'tools' node.")
-        print("-----------------------------\n")
-        return "call_tool"
-    
     # 2. Safety Fallback: Sometimes Gemini puts it in additional_kwargs (Older style)
-    # This catches cases where tool_calls might be empty but the data exists elsewhere
-    if "function_call" in last_message.additional_kwargs:
-        print("✅ DECISION: Routing to 'tools' node (via fallback).")
-        print("-----------------------------\n")
-        return "call_tool"
+    if tool_calls or "function_call" in last_message.additional_kwargs:
+        decision = "call_tool"
+    else:
+        decision = "end"
 
-    print("🛑 DECISION: Routing to END.")
-    print("-----------------------------\n")
-    return "end"
+    log_event("router_decision", decision=decision, message_type=last_message.type, tool_calls=len(tool_calls))
+    return decision
 
 # ... (Ens
 workflow = StateGraph(SurveillanceState)
 
-workflow.add_node("analyst", analyst_node)
-workflow.add_node("tools", tool_node)
+workflow.add_node("analyst", timed_node("agent2", "analyst", analyst_node))
+workflow.add_node("tools", timed_node("agent2", "tools", tool_node))
 
 workflow.add_edge(START, "analyst")
 
@@ -202,4 +303,68 @@ workflow.add_conditional_edges(
 # After tool runs, go back to analyst (to see if more routes need flagging or to finish)
 workflow.add_edge("tools", "analyst")
 
-surveillance_agent = workflow.compile()
\ No newline at end of file
+_surveillance_agent = None
+
+def get_surveillance_agent():
+    """The compiled surveillance graph, compiled on first use."""
+    global _surveillance_agent
+    if _surveillance_agent is None:
+        _surveillance_agent = workflow.compile()
+    return _surveillance_agent
+
+def __getattr__(name):
+    if name == "surveillance_agent":
+        return get_surveillance_agent()
+    raise AttributeError(name)
+# --- 6. SHARDED SCANS ---
+SHARD_SIZE = int(os.getenv("SURVEILLANCE_SHARD_SIZE", "200"))            # routes per analyst run
+SHARD_CONCURRENCY = int(os.getenv("SURVEILLANCE_SHARD_CONCURRENCY", "4"))  # analyst runs in flight
+
+def shard_routes(route_data: Dict[str, List[float]], size: Optional[int] = None) -> List[Dict[str, List[float]]]:
+    items = list(route_data.items())
+    size = max(1, size or SHARD_SIZE)
+    return [dict(items[i:i + size]) for i in range(0, len(items), size)] or [{}]
+
+async def scan_routes(route_data: Dict[str, List[float]]) -> Dict:
+    """
+    Runs the surveillance graph over bounded chunks of the payload concurrently
+    (at most SHARD_CONCURRENCY at a time) and merges their reports and flag lists.
+    Small payloads run as a single shard, exactly like one graph invocation.
+    A failed shard does not discard the others: their flags were already sent,
+    so the successful shards are merged and the failed routes are reported.
+    """
+    shards = shard_routes(route_data)
+    semaphore = asyncio.Semaphore(max(1, SHARD_CONCURRENCY))
+
+    async def run(shard):
+        # Background work: yields the LLM quota to emergency and chat calls
+        async with semaphore:
+            with llm_priority(SURVEILLANCE):
+                return await get_surveillance_agent().ainvoke({"route_data": shard, "messages": []})
+
+    outcomes = await asyncio.gather(*(run(shard) for shard in shards), return_exceptions=True)
+
+    results, failed_routes = [], []
+    for index, (shard, outcome) in enumerate(zip(shards, outcomes)):
+        if isinstance(outcome, BaseException):
+            log_event("surveillance_shard_failed", level=logging.ERROR, shard=index, routes=len(shard), error=str(outcome))
+            failed_routes.extend(shard)
+        else:
+            results.append(outcome)
+    if not results:
+        raise outcomes[0]  # nothing was scanned: fail the whole call as before
+
+    reports = [r["messages"][-1].content for r in results]
+    findings = [report for report in reports if report != "Surveillance Clean"]
+    failed_shards = len(shards) - len(results)
+    if failed_shards:
+        findings.append(f"Surveillance incomplete: {failed_shards} of {len(shards)} shards "
+                        f"({len(failed_routes)} routes) failed and were not scanned")
+    return {
+        "ai_report": "\n\n".join(findings) if findings else "Surveillance Clean",
+        "flagged_routes": [route for r in results for route in r.get("flagged_routes", [])],
+        "suppressed_routes": [route for r in results for route in r.get("suppressed_routes", [])],
+        "shards": len(shards),
+        "failed_shards": failed_shards,
+        "failed_routes": failed_routes,
+    }
@@ -0,0 +1,361 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from brain.metrics import LLM_SECONDS, LLM_TOKENS, LLM_RETRIES, span, log_event
+from brain.llm_scheduler import llm_scheduler
+from brain.hedging import hedger, current_node
+
+# --- CONFIG ---
+# LLM_MODE: "live" (default) calls Gemini, "record" calls Gemini and writes every
+# request/response pair to the cassette, "replay" answers from the cassette offline,
+# "stub" invents schema-valid answers (for benchmarks; see benchmark.py).
+LLM_MODE = os.getenv("LLM_MODE", "live")
+CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/ai_engine.jsonl")
+# Injected latency for the offline modes (replay and stub)
+INJECTED_LATENCY_MS = float(os.getenv("LLM_INJECTED_LATENCY_MS", "0"))
+INJECTED_JITTER_MS = float(os.getenv("LLM_INJECTED_JITTER_MS", "0"))
+STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+STUB_TOOL_CALL_RATE = float(os.getenv("LLM_STUB_TOOL_CALL_RATE", "0"))
+# Attempts per call (retries happen here so they can be counted); max_retries=N passed
+# to get_chat_model overrides it, with the same meaning ChatGoogleGenerativeAI gives it
+MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "6"))
+RETRY_BACKOFF_S = float(os.getenv("LLM_RETRY_BACKOFF_S", "0.5"))
+
+
+class CassetteMiss(LookupError):
+    """Replay mode got a request that was never recorded."""
+
+
+class StubFailure(RuntimeError):
+    """Injected failure from the stub model."""
+
+
+# --- 1. CASSETTE ---
+class Cassette:
+    """JSONL file of {"key", "request", "response"} lines, indexed by request key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses: Dict[str, List[Dict[str, Any]]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry["response"]
+
+    @staticmethod
+    def request_summary(model: str, messages: List[BaseMessage], tool_schemas: Optional[List[Dict]]) -> Dict[str, Any]:
+        # Ids are generated per run, so only the content that drives the answer is keyed
+        return {
+            "model": model,
+            "messages": [
+                {
+                    "type": m.type,
+                    "content": m.content,
+                    "tool_calls": [{"name": c["name"], "args": c["args"]} for c in getattr(m, "tool_calls", None) or []],
+                }
+                for m in messages
+            ],
+            "tools": sorted(t["function"]["name"] for t in tool_schemas or []),
+        }
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        response = self._responses.get(key)
+        return messages_from_dict(response)[0] if response is not None else None
+
+    def put(self, key: str, request: Dict[str, Any], message: BaseMessage) -> None:
+        response = messages_to_dict([message])
+        self._responses[key] = response
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"key": key, "request": request, "response": response}, default=str) + "\n")
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def get_cassette(path: str = CASSETTE_PATH) -> Cassette:
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+# --- 2. STUB RESPONSES ---
+def _stub_value(schema: Dict[str, Any], name: str, defs: Dict[str, Any]) -> Any:
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].split("/")[-1]]
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {k: _stub_value(v, k, defs) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_stub_value(schema.get("items", {}), name, defs)]
+    if kind == "number":
+        # Safety scores are 1-10, expert scores 0-1
+        return round(random.uniform(1, 10), 1) if "final" in name else round(random.random(), 2)
+    if kind == "integer":
+        return random.randint(0, 10)
+    if kind == "boolean":
+        return False
+    return f"stub {name}"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def stub_response(messages: List[BaseMessage], tool_schemas: Optional[List[Dict]], tool_choice: Any) -> ChatResult:
+    """Schema-valid fake answer: forced tool calls get generated args, free text gets a canned reply."""
+    if random.random() < STUB_FAILURE_RATE:
+        raise StubFailure("Injected stub LLM failure")
+
+    forced = tool_choice in ("any", "required", True)
+    # Action tools are only called on a fresh prompt, so tool loops terminate
+    optional_call = tool_schemas and messages and messages[-1].type == "human" and random.random() < STUB_TOOL_CALL_RATE
+    if tool_schemas and (forced or optional_call):
+        function = tool_schemas[0]["function"]
+        parameters = function.get("parameters", {})
+        args = _stub_value(parameters, function["name"], parameters.get("$defs", {}))
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": function["name"], "args": args, "id": f"stub-{random.getrandbits(32):08x}"}],
+        )
+    else:
+        message = AIMessage(content="Surveillance Clean" if tool_schemas else "No textual anomaly detected, but throttle pressed by user.")
+    # Rough token counts so token metrics are meaningful in benchmarks
+    prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+    response_tokens = estimate_tokens(str(message.content) + json.dumps(message.tool_calls, default=str))
+    message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": response_tokens,
+                              "total_tokens": prompt_tokens + response_tokens}
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+# --- 3. PROVIDER MODEL ---
+class ProviderChatModel(BaseChatModel):
+    """
+    Chat model used by every graph in ai_engine/brain. Delegates to the real
+    Gemini client or to a cassette depending on `mode`. Structured output goes
+    through tool calling so that all modes share one code path. The Gemini
+    client is shared through the registry and only built on first use, unless
+    one is passed explicitly as `inner`. Every async attempt waits for a slot
+    from the shared llm_scheduler, and calls made under `hedging.hedged` may
+    send a duplicate request when they run slow.
+    """
+
+    model: str
+    mode: str = "live"
+    inner: Optional[Any] = None
+    client_kwargs: Dict[str, Any] = {}
+    cassette: Optional[Any] = None
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    max_attempts: int = 1
+    retry_backoff_s: float = RETRY_BACKOFF_S
+
+    @property
+    def _llm_type(self) -> str:
+        return "ai-engine-provider"
+
+    def bind_tools(self, tools, *, tool_choice: Optional[Any] = None, **kwargs: Any):
+        # Gemini's own tool format is derived on the first live call, so binding builds no client
+        tool_schemas = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tool_schemas=tool_schemas, tool_choice=tool_choice, native_tools=list(tools), **kwargs)
+
+    def client(self):
+        return self.inner if self.inner is not None else shared_client(self.model, self.client_kwargs)
+
+    def _native_kwargs(self, client, native_tools, tool_schemas, tool_choice) -> Dict[str, Any]:
+        if not native_tools:
+            return {}
+        key = (id(client), json.dumps(tool_schemas, sort_keys=True, default=str), repr(tool_choice))
+        if key not in _native_tool_kwargs:
+            _native_tool_kwargs[key] = dict(client.bind_tools(native_tools, tool_choice=tool_choice).kwargs)
+        return _native_tool_kwargs[key]
+
+    def _replay(self, messages: List[BaseMessage], tool_schemas: Optional[List[Dict]]) -> ChatResult:
+        request = Cassette.request_summary(self.model, messages, tool_schemas)
+        message = self.cassette.get(Cassette.key(request))
+        if message is None:
+            raise CassetteMiss(f"No recorded response for {self.model} request in {self.cassette.path}")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _record(self, messages: List[BaseMessage], tool_schemas: Optional[List[Dict]], result: ChatResult) -> None:
+        request = Cassette.request_summary(self.model, messages, tool_schemas)
+        self.cassette.put(Cassette.key(request), request, result.generations[0].message)
+
+    def _injected_delay(self) -> float:
+        return (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+
+    def _backoff(self, attempt: int) -> float:
+        return self.retry_backoff_s * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+    def _observe(self, attempt: int, started: float, result: Optional[ChatResult], error: Optional[Exception]) -> bool:
+        """Records one attempt; returns True when the caller should retry."""
+        LLM_SECONDS.observe(time.perf_counter() - started, model=self.model, outcome="ok" if error is None else "error")
+        if error is None:
+            usage = getattr(result.generations[0].message, "usage_metadata", None) or {}
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), model=self.model, kind="prompt")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), model=self.model, kind="response")
+            return False
+        if isinstance(error, CassetteMiss) or attempt >= self.max_attempts:
+            log_event("llm_failed", level=logging.ERROR, model=self.model, attempt=attempt, error=str(error))
+            return False
+        LLM_RETRIES.inc(model=self.model)
+        log_event("llm_retry", level=logging.WARNING, model=self.model, attempt=attempt, error=str(error))
+        return True
+
+    async def _agenerate_once(self, messages, stop, tool_schemas, tool_choice, native_tools):
+        if self.mode == "stub":
+            await asyncio.sleep(self._injected_delay())
+            return stub_response(messages, tool_schemas, tool_choice)
+        if self.mode == "replay":
+            await asyncio.sleep(self._injected_delay())
+            return self._replay(messages, tool_schemas)
+
+        client = self.client()
+        result = await client._agenerate(messages, stop=stop, **self._native_kwargs(client, native_tools, tool_schemas, tool_choice))
+        if self.mode == "record":
+            self._record(messages, tool_schemas, result)
+        return result
+
+    def _generate_once(self, messages, stop, tool_schemas, tool_choice, native_tools):
+        if self.mode == "stub":
+            time.sleep(self._injected_delay())
+            return stub_response(messages, tool_schemas, tool_choice)
+        if self.mode == "replay":
+            time.sleep(self._injected_delay())
+            return self._replay(messages, tool_schemas)
+
+        client = self.client()
+        result = client._generate(messages, stop=stop, **self._native_kwargs(client, native_tools, tool_schemas, tool_choice))
+        if self.mode == "record":
+            self._record(messages, tool_schemas, result)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, *, tool_schemas=None, tool_choice=None, native_tools=None, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            started = None
+
+            async def scheduled(mark_sent=None):
+                nonlocal started
+                # Each attempt (and each hedge duplicate) spends quota, so each one waits for its own slot
+                async with llm_scheduler.slot():
+                    if started is None:
+                        started = time.perf_counter()  # attempt latency excludes the scheduler queue
+                    if mark_sent is not None:
+                        mark_sent()
+                    with span("llm", model=self.model, attempt=attempt):
+                        return await self._agenerate_once(messages, stop, tool_schemas, tool_choice, native_tools)
+
+            try:
+                node = current_node()
+                result = await (hedger.run(node, scheduled) if node else scheduled())
+            except Exception as e:
+                if not self._observe(attempt, started, None, e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._observe(attempt, started, result, None)
+            return result
+
+    def _generate(self, messages, stop=None, run_manager=None, *, tool_schemas=None, tool_choice=None, native_tools=None, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                with span("llm", model=self.model, attempt=attempt):
+                    result = self._generate_once(messages, stop, tool_schemas, tool_choice, native_tools)
+            except Exception as e:
+                if not self._observe(attempt, started, None, e):
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            self._observe(attempt, started, result, None)
+            return result
+
+
+# --- 4. MODEL REGISTRY ---
+# One provider model per distinct config and one Gemini client (with its HTTP
+# connection pool) per distinct client config, shared by every graph.
+_models: Dict[str, ProviderChatModel] = {}
+_clients: Dict[str, Any] = {}
+_native_tool_kwargs: Dict[Any, Dict[str, Any]] = {}
+_client_lock = threading.Lock()
+
+
+def _config_key(model: str, kwargs: Dict[str, Any]) -> str:
+    return json.dumps({"model": model, **kwargs}, sort_keys=True, default=str)
+
+
+def shared_client(model: str, client_kwargs: Dict[str, Any]):
+    """The Gemini client for this config, built (and the SDK imported) on first use."""
+    key = _config_key(model, client_kwargs)
+    client = _clients.get(key)
+    if client is None:
+        with _client_lock:
+            client = _clients.get(key)
+            if client is None:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+                # Single attempt per call: ProviderChatModel does the retrying
+                client = _clients[key] = ChatGoogleGenerativeAI(model=model, max_retries=1, **client_kwargs)
+    return client
+
+
+def get_chat_model(model: str = "gemini-2.0-flash", **kwargs: Any) -> ProviderChatModel:
+    """
+    Returns the (shared) chat model for the configured LLM_MODE. kwargs go to
+    ChatGoogleGenerativeAI, except max_retries which sets the provider's attempts.
+    """
+    if LLM_MODE not in ("live", "record", "replay", "stub"):
+        raise ValueError(f"Unknown LLM_MODE: {LLM_MODE}")
+
+    key = _config_key(model, kwargs)
+    if key in _models:
+        return _models[key]
+
+    if LLM_MODE in ("live", "record") and not os.getenv("GOOGLE_API_KEY"):
+        raise ValueError("GOOGLE_API_KEY not found! Please check your ai_engine/.env file.")
+
+    client_kwargs = dict(kwargs)
+    max_attempts = max(1, int(client_kwargs.pop("max_retries", MAX_ATTEMPTS)))
+    _models[key] = ProviderChatModel(
+        model=model,
+        mode=LLM_MODE,
+        client_kwargs=client_kwargs,
+        cassette=get_cassette() if LLM_MODE in ("record", "replay") else None,
+        latency_ms=INJECTED_LATENCY_MS,
+        jitter_ms=INJECTED_JITTER_MS,
+        max_attempts=max_attempts,
+    )
+    return _models[key]
+
+
+def warm_up() -> int:
+    """Builds every registered model's client ahead of the first request; returns the client count."""
+    for provider in list(_models.values()):
+        if provider.mode in ("live", "record") and provider.inner is None:
+            shared_client(provider.model, provider.client_kwargs)
+    return len(_clients)
+
+
+def registry_stats() -> Dict[str, Any]:
+    return {"models": len(_models), "clients": len(_clients), "client_configs": list(_clients)}
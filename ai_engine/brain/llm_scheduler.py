@@ -0,0 +1,165 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextlib
+import contextvars
+from typing import Dict, List, Optional, Tuple
+from brain.metrics import LLM_QUEUE_SECONDS
+
+# --- CONFIG ---
+# Every LLM attempt takes a slot here before it reaches the provider (see ProviderChatModel)
+SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+EMERGENCY_RESERVE = int(os.getenv("LLM_EMERGENCY_RESERVE", "2"))  # slots only emergency calls may use
+RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", "0"))    # our Gemini RPM quota; 0 = no rate limit
+RATE_BURST = float(os.getenv("LLM_RATE_BURST", "10"))
+
+# Lower value = served first
+EMERGENCY, CHAT, SURVEILLANCE = "emergency", "chat", "surveillance"
+PRIORITIES = {EMERGENCY: 0, CHAT: 1, SURVEILLANCE: 2}
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=CHAT)
+
+
+@contextlib.contextmanager
+def llm_priority(name: str):
+    """Runs the enclosed LLM calls (and the graph tasks started inside) at this priority."""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class LLMScheduler:
+    """
+    Priority queue in front of the shared Gemini quota. A call runs once a
+    concurrency slot and a rate token are both free; waiting calls are served
+    emergency first, then chat, then surveillance (FIFO within a class), and the
+    last `emergency_reserve` slots are kept for emergency calls so a saturating
+    background load can't make an emergency wait for a slow call to finish.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        emergency_reserve: int = EMERGENCY_RESERVE,
+        rate_per_minute: float = RATE_PER_MINUTE,
+        burst: float = RATE_BURST,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.emergency_reserve = min(max(0, emergency_reserve), self.max_concurrency - 1)
+        self.rate = rate_per_minute / 60
+        self.burst = max(1.0, burst)
+        self._reset(None)
+        self.granted = {name: 0 for name in PRIORITIES}
+        self.throttled = 0  # times the queue head had to wait for a rate token
+
+    def _reset(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        # Futures and timers belong to one loop, so a new loop starts from a clean queue
+        self._loop = loop
+        self._queue: List[Tuple[int, int, str, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._tokens = self.burst
+        self._refilled = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _limit(self, priority: str) -> int:
+        return self.max_concurrency if priority == EMERGENCY else self.max_concurrency - self.emergency_reserve
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _grant(self, priority: str, enqueued: float) -> None:
+        self._in_flight += 1
+        if self.rate > 0:
+            self._tokens -= 1
+        self.granted[priority] += 1
+        LLM_QUEUE_SECONDS.observe(time.monotonic() - enqueued, priority=priority)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._queue:
+            rank, _, priority, enqueued, future = self._queue[0]
+            if future.done():  # caller gave up while queued
+                heapq.heappop(self._queue)
+                continue
+            if self._in_flight >= self._limit(priority):
+                return
+            if self.rate > 0:
+                self._refill()
+                if self._tokens < 1:
+                    self.throttled += 1
+                    self._timer = self._loop.call_later((1 - self._tokens) / self.rate, self._dispatch)
+                    return
+            heapq.heappop(self._queue)
+            self._grant(priority, enqueued)
+            future.set_result(None)
+
+    async def acquire(self, priority: str) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+        enqueued = time.monotonic()
+
+        if not self._queue and self._in_flight < self._limit(priority):
+            if self.rate <= 0:
+                return self._grant(priority, enqueued)
+            self._refill()
+            if self._tokens >= 1:
+                return self._grant(priority, enqueued)
+
+        future = loop.create_future()
+        heapq.heappush(self._queue, (PRIORITIES[priority], next(self._seq), priority, enqueued, future))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was granted just as the caller was cancelled
+            raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Optional[str] = None):
+        if not SCHEDULER_ENABLED:
+            yield
+            return
+        await self.acquire(priority or current_priority())
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, float]:
+        queued = {name: 0 for name in PRIORITIES}
+        for _, _, priority, _, future in self._queue:
+            if not future.done():
+                queued[priority] += 1
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            **{f"queued_{name}": count for name, count in queued.items()},
+            **{f"granted_{name}": count for name, count in self.granted.items()},
+            "throttled": self.throttled,
+            "tokens": round(self._tokens, 2) if self.rate > 0 else None,
+        }
+
+
+llm_scheduler = LLMScheduler()
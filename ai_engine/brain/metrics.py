@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import random
+import logging
+import functools
+import contextlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# --- CONFIG ---
+# OTEL_ENABLED wraps nodes and LLM calls in OpenTelemetry spans (needs opentelemetry-api + an SDK)
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() in ("1", "true", "yes")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))  # share of routine events logged; warnings always are
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+# --- 1. METRIC TYPES (Prometheus text exposition, no client library needed) ---
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{n}="{str(v)}"'.replace("\n", " ") for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {value:g}" for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count:g}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]:g}")
+        return lines
+
+
+class CallbackMetric:
+    """Reads its values from `read()` at scrape time, e.g. the counters a cache already keeps."""
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Iterable[str],
+                 read: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {value:g}" for key, value in self.read().items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                log_event("metrics_collect_failed", level=logging.WARNING, metric=metric.name, error=str(e))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+NODE_SECONDS = registry.register(Histogram(
+    "ai_engine_node_seconds", "Wall time of each graph node", ["graph", "node"]))
+LLM_SECONDS = registry.register(Histogram(
+    "ai_engine_llm_request_seconds", "Latency of one LLM attempt", ["model", "outcome"]))
+LLM_TOKENS = registry.register(Counter(
+    "ai_engine_llm_tokens_total", "Prompt and response tokens reported by the LLM", ["model", "kind"]))
+LLM_RETRIES = registry.register(Counter(
+    "ai_engine_llm_retries_total", "LLM attempts retried after an error", ["model"]))
+TOOL_CALLS = registry.register(Counter(
+    "ai_engine_tool_calls_total", "Tool calls by outcome", ["tool", "outcome"]))
+LLM_QUEUE_SECONDS = registry.register(Histogram(
+    "ai_engine_llm_queue_seconds", "Time an LLM attempt waited for the scheduler", ["priority"]))
+LLM_HEDGES = registry.register(Counter(
+    "ai_engine_llm_hedge_calls_total", "Hedge-eligible LLM attempts by whether a duplicate was sent", ["node", "outcome"]))
+LLM_HEDGE_WINS = registry.register(Counter(
+    "ai_engine_llm_hedge_wins_total", "Which request answered first when a duplicate was sent", ["node", "winner"]))
+BACKEND_SECONDS = registry.register(Histogram(
+    "ai_engine_backend_request_seconds", "Latency of requests to the Node backend", ["endpoint", "outcome"]))
+
+
+def register_stats(name: str, documentation: str, kind: str, stats: Callable[[], Dict[str, float]],
+                   keys: Iterable[str], label: str = "result") -> None:
+    """Exports selected keys of an existing stats() dict as one labelled metric."""
+    keys = tuple(keys)
+    registry.register(CallbackMetric(
+        name, documentation, kind, [label],
+        lambda: {(k,): float(v) for k, v in stats().items() if k in keys},
+    ))
+
+
+# --- 2. STRUCTURED LOGS ---
+logger = logging.getLogger("ai_engine")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log_event(event: str, level: int = logging.INFO, sampled: bool = True, **fields: Any) -> None:
+    """
+    One JSON line per event. Routine events (below WARNING) are sampled at
+    LOG_SAMPLE_RATE unless `sampled=False`; warnings and errors are always kept.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if sampled and level < logging.WARNING and random.random() >= LOG_SAMPLE_RATE:
+        return
+    record = {"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(), "event": event, **fields}
+    logger.log(level, json.dumps(record, default=str))
+
+
+# --- 3. TRACING ---
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("ai_engine")
+    except ImportError:
+        log_event("otel_unavailable", level=logging.WARNING, reason="opentelemetry is not installed; spans disabled")
+
+
+def span(name: str, **attributes: Any):
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.start_as_current_span(name, attributes={k: str(v) for k, v in attributes.items()})
+
+
+def timed_node(graph: str, node: str, fn: Callable):
+    """Wraps an async graph node so its wall time lands in ai_engine_node_seconds (and a span)."""
+    @functools.wraps(fn)
+    async def wrapper(state, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        with span(f"{graph}.{node}", graph=graph, node=node):
+            try:
+                return await fn(state, *args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                NODE_SECONDS.observe(elapsed, graph=graph, node=node)
+                log_event("node_finished", graph=graph, node=node, outcome=outcome, seconds=round(elapsed, 4))
+    return wrapper
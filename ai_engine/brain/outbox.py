@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from brain.http_client import get_http_client
+from brain.metrics import BACKEND_SECONDS, log_event
+
+# --- CONFIG ---
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.db")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_S = float(os.getenv("OUTBOX_POLL_S", "5"))               # idle wake-up when nothing is due
+OUTBOX_BACKOFF_S = float(os.getenv("OUTBOX_BACKOFF_S", "1"))         # first retry delay, doubled per attempt
+OUTBOX_MAX_BACKOFF_S = float(os.getenv("OUTBOX_MAX_BACKOFF_S", "300"))
+
+# 4xx answers other than these will never succeed on retry; such records are parked, not dropped
+RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+class Outbox:
+    """
+    Durable queue of backend writes. enqueue() only appends a row to a local
+    SQLite file, so callers never wait on the Node backend; a background worker
+    delivers due rows over the shared HTTP client and deletes them on success.
+    Failed deliveries are retried with exponential backoff and jitter for as
+    long as it takes; rows rejected with a permanent 4xx are kept as 'dead'.
+    """
+
+    def __init__(self, db_path: str = OUTBOX_DB, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.failed_attempts = 0
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # Opened on first use, so importing the module never creates the file
+        if self._conn is None:
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, endpoint TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, created REAL NOT NULL, last_error TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+            db.commit()
+            self._conn = db
+        return self._conn
+
+    # --- PRODUCER ---
+    def enqueue(self, endpoint: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        cursor = self._db.execute(
+            "INSERT INTO outbox (endpoint, payload, next_attempt, created) VALUES (?, ?, ?, ?)",
+            (endpoint, json.dumps(payload, default=str), now, now),
+        )
+        self._db.commit()
+        if self._wake is not None:
+            self._wake.set()
+        return cursor.lastrowid
+
+    # --- WORKER ---
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._wake = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Undelivered rows stay on disk and are picked up after the next start
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        self._wake = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                delivered_any = await self.deliver_due()
+            except Exception as e:
+                log_event("outbox_worker_error", level=logging.ERROR, error=str(e))
+                delivered_any = False
+            if delivered_any:
+                continue  # there may be more due rows
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._idle_wait())
+            except asyncio.TimeoutError:
+                pass
+
+    def _idle_wait(self) -> float:
+        row = self._db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        if row is None or row[0] is None:
+            return OUTBOX_POLL_S
+        return min(OUTBOX_POLL_S, max(0.0, row[0] - time.time()))
+
+    async def deliver_due(self) -> bool:
+        """Sends one batch of due rows concurrently; returns True if the batch was full."""
+        rows: List[Tuple[int, str, str, int]] = self._db.execute(
+            "SELECT id, endpoint, payload, attempts FROM outbox "
+            "WHERE status = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+            (time.time(), self.batch_size),
+        ).fetchall()
+        if not rows:
+            return False
+        await asyncio.gather(*(self._deliver(*row) for row in rows))
+        return len(rows) == self.batch_size
+
+    async def _deliver(self, row_id: int, endpoint: str, payload: str, attempts: int) -> None:
+        started = time.perf_counter()
+        try:
+            response = await get_http_client().post(endpoint, content=payload, headers={"Content-Type": "application/json"})
+            status, error = response.status_code, None if response.is_success else f"HTTP {response.status_code}"
+        except Exception as e:
+            status, error = "error", f"{type(e).__name__}: {e}"
+        BACKEND_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint.rsplit("/", 1)[-1], outcome=status)
+
+        if error is None:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+            self._db.commit()
+            self.delivered += 1
+            return
+
+        self.failed_attempts += 1
+        attempts += 1
+        permanent = isinstance(status, int) and 400 <= status < 500 and status not in RETRYABLE_STATUS
+        delay = min(OUTBOX_MAX_BACKOFF_S, OUTBOX_BACKOFF_S * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        self._db.execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            ("dead" if permanent else "pending", attempts, time.time() + delay, error, row_id),
+        )
+        self._db.commit()
+        log_event("outbox_delivery_failed", level=logging.ERROR if permanent else logging.WARNING,
+                  id=row_id, endpoint=endpoint, attempts=attempts, error=error, parked=permanent)
+
+    def stats(self) -> Dict[str, Any]:
+        counts = dict(self._db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        oldest = self._db.execute("SELECT MIN(created) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "dead": counts.get("dead", 0),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "oldest_pending_age_s": round(time.time() - oldest, 1) if oldest else 0.0,
+            "worker_running": self._worker is not None and not self._worker.done(),
+        }
+
+
+outbox = Outbox()
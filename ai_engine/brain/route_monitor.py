@@ -0,0 +1,164 @@
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+import numpy as np
+from brain.route_rules import RAPID_DROP, LOW_SCORE, LOW_WINDOW
+
+# --- CONFIG ---
+HISTORY_CAPACITY = int(os.getenv("ROUTE_MONITOR_CAPACITY", "64"))   # scores kept per route
+EWMA_ALPHA = float(os.getenv("ROUTE_MONITOR_EWMA_ALPHA", "0.3"))
+CUSUM_SLACK = float(os.getenv("ROUTE_MONITOR_CUSUM_SLACK", "0.5"))  # drift ignored per step
+CUSUM_THRESHOLD = float(os.getenv("ROUTE_MONITOR_CUSUM_THRESHOLD", "4"))
+MAX_EVENTS = int(os.getenv("ROUTE_MONITOR_MAX_EVENTS", "1000"))
+
+
+class RouteMonitor:
+    """
+    Per-route surveillance state kept in shared NumPy arrays: one ring-buffer row
+    of scores per route plus the running EWMA, downward CUSUM and low-score
+    streak. Each new score updates the state and checks the danger rules in
+    O(1), so danger events are emitted the moment the score arrives.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY, initial_routes: int = 256):
+        self.capacity = capacity
+        self._rows: Dict[str, int] = {}
+        self._scores = np.full((initial_routes, capacity), np.nan, dtype=np.float32)
+        self._head = np.zeros(initial_routes, dtype=np.int32)    # next write position
+        self._count = np.zeros(initial_routes, dtype=np.int32)
+        self._ewma = np.full(initial_routes, np.nan)
+        self._cusum = np.zeros(initial_routes)
+        self._low_streak = np.zeros(initial_routes, dtype=np.int32)
+        self._version = np.zeros(initial_routes, dtype=np.int64)  # bumps on every new score
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+
+    # --- STORAGE ---
+    def _row(self, route_id: str) -> int:
+        row = self._rows.get(route_id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self._head):
+                self._grow()
+            self._rows[route_id] = row
+        return row
+
+    def _grow(self) -> None:
+        size = len(self._head) * 2
+        def extend(a, fill):
+            out = np.full((size,) + a.shape[1:], fill, dtype=a.dtype)
+            out[: len(a)] = a
+            return out
+        self._scores = extend(self._scores, np.nan)
+        self._head = extend(self._head, 0)
+        self._count = extend(self._count, 0)
+        self._ewma = extend(self._ewma, np.nan)
+        self._cusum = extend(self._cusum, 0.0)
+        self._low_streak = extend(self._low_streak, 0)
+        self._version = extend(self._version, 0)
+
+    def history(self, route_id: str) -> List[float]:
+        """Stored scores of a route, oldest first."""
+        row = self._rows.get(route_id)
+        if row is None:
+            return []
+        count, head = int(self._count[row]), int(self._head[row])
+        idx = (np.arange(head - count, head)) % self.capacity
+        return self._scores[row, idx].astype(float).tolist()
+
+    # --- INGEST ---
+    def ingest(self, route_id: str, scores: Iterable[float]) -> List[Dict[str, Any]]:
+        row = self._row(route_id)
+        events = []
+        for score in scores:
+            events.extend(self._push(route_id, row, float(score)))
+        self.events.extend(events)
+        return events
+
+    def _push(self, route_id: str, row: int, score: float) -> List[Dict[str, Any]]:
+        events = []
+        count, head = self._count[row], self._head[row]
+        previous = float(self._scores[row, (head - 1) % self.capacity]) if count else None
+        baseline = self._ewma[row]
+
+        # Ring buffer write
+        self._scores[row, head] = score
+        self._head[row] = (head + 1) % self.capacity
+        self._count[row] = min(count + 1, self.capacity)
+        self._version[row] += 1
+
+        # Rule 1: rapid drop between consecutive scores
+        if previous is not None and previous - score >= RAPID_DROP:
+            events.append(self._event(route_id, "rapid_drop", score, f"dropped {previous - score:g} points ({previous:g} -> {score:g})"))
+
+        # Rule 2: last LOW_WINDOW scores all low (fires once when the streak reaches the window)
+        self._low_streak[row] = self._low_streak[row] + 1 if score < LOW_SCORE else 0
+        if self._low_streak[row] == LOW_WINDOW:
+            events.append(self._event(route_id, "low_average", score, f"last {LOW_WINDOW} scores below {LOW_SCORE:g}"))
+
+        # Rule 3: one-sided CUSUM against the EWMA baseline catches slow sustained declines
+        if not np.isnan(baseline):
+            self._cusum[row] = max(0.0, self._cusum[row] + (baseline - score - CUSUM_SLACK))
+            if self._cusum[row] > CUSUM_THRESHOLD:
+                events.append(self._event(route_id, "cusum_shift", score, f"sustained decline below baseline {baseline:.2f}"))
+                self._cusum[row] = 0.0
+        self._ewma[row] = score if np.isnan(baseline) else EWMA_ALPHA * score + (1 - EWMA_ALPHA) * baseline
+
+        return events
+
+    @staticmethod
+    def _event(route_id: str, kind: str, score: float, detail: str) -> Dict[str, Any]:
+        return {"routeId": route_id, "type": kind, "score": score, "detail": detail, "timestamp": time.time()}
+
+    # --- QUERIES ---
+    def version(self, route_id: str) -> int:
+        row = self._rows.get(route_id)
+        return int(self._version[row]) if row is not None else 0
+
+    def route_ids(self) -> List[str]:
+        return list(self._rows)
+
+    def snapshot(self, route_ids: Optional[Iterable[str]] = None) -> Dict[str, List[float]]:
+        """{routeId: history} in the same shape /agent2 accepts."""
+        return {r: self.history(r) for r in (route_ids if route_ids is not None else self._rows)}
+
+    def state(self, route_id: str) -> Optional[Dict[str, Any]]:
+        row = self._rows.get(route_id)
+        if row is None:
+            return None
+        return {
+            "routeId": route_id,
+            "history": self.history(route_id),
+            "ewma": None if np.isnan(self._ewma[row]) else round(float(self._ewma[row]), 3),
+            "cusum": round(float(self._cusum[row]), 3),
+            "low_streak": int(self._low_streak[row]),
+            "version": int(self._version[row]),
+        }
+
+    def remove(self, route_id: str) -> bool:
+        row = self._rows.pop(route_id, None)
+        if row is None:
+            return False
+        # Move the last row into the freed slot to keep rows dense
+        last = len(self._rows)
+        if row != last:
+            moved = next(r for r, i in self._rows.items() if i == last)
+            for a in (self._scores, self._head, self._count, self._ewma, self._cusum, self._low_streak, self._version):
+                a[row] = a[last]
+            self._rows[moved] = row
+        self._scores[last] = np.nan
+        self._head[last] = self._count[last] = self._low_streak[last] = self._version[last] = 0
+        self._ewma[last] = np.nan
+        self._cusum[last] = 0.0
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes": len(self._rows),
+            "capacity_per_route": self.capacity,
+            "buffer_bytes": int(self._scores.nbytes),
+            "recent_events": len(self.events),
+        }
+
+
+route_monitor = RouteMonitor()
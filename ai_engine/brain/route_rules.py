@@ -0,0 +1,62 @@
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+
+# --- CONFIG ---
+# Same danger criteria the analyst prompt describes, evaluated locally
+LOCAL_RULES_ENABLED = os.getenv("SURVEILLANCE_LOCAL_RULES", "true").lower() in ("1", "true", "yes")
+RAPID_DROP = float(os.getenv("SURVEILLANCE_RAPID_DROP", "3"))      # latest score >= 3 points under the recent peak
+DROP_WINDOW = int(os.getenv("SURVEILLANCE_DROP_WINDOW", "3"))      # ... peak taken over the last N steps
+LOW_SCORE = float(os.getenv("SURVEILLANCE_LOW_SCORE", "5"))        # last N scores all below this
+LOW_WINDOW = int(os.getenv("SURVEILLANCE_LOW_WINDOW", "3"))
+HISTORY_WINDOW = int(os.getenv("SURVEILLANCE_HISTORY_WINDOW", "20"))  # newest scores kept per route
+
+
+def pack(route_data: Dict[str, List[float]], width: int = HISTORY_WINDOW) -> Tuple[List[str], np.ndarray]:
+    """Right-aligned (latest score in the last column), NaN-padded matrix of the newest `width` scores."""
+    width = max(width, DROP_WINDOW + 1, LOW_WINDOW)
+    route_ids = [r for r, scores in route_data.items() if scores]
+    matrix = np.full((len(route_ids), width), np.nan)
+    for row, route_id in enumerate(route_ids):
+        tail = route_data[route_id][-width:]
+        matrix[row, width - len(tail):] = tail
+    return route_ids, matrix
+
+
+def evaluate(route_data: Dict[str, List[float]]) -> Dict[str, Dict]:
+    """
+    Applies the danger criteria to every route in one vectorized pass and
+    returns {route_id: findings} for the routes that match at least one.
+    """
+    route_ids, m = pack(route_data)
+    if not route_ids:
+        return {}
+
+    # Fall from the running maximum of the recent window to the latest score, so a
+    # steady decline (10, 8, 6, 4) counts as well as one big step; fmax skips the NaN padding
+    recent = m[:, -(DROP_WINDOW + 1):]
+    max_drop = np.fmax.accumulate(recent, axis=1)[:, -1] - recent[:, -1]
+    rapid_drop = max_drop >= RAPID_DROP
+
+    # NaN < LOW_SCORE is False, so routes with too few scores never match
+    low_tail = m[:, -LOW_WINDOW:]
+    low_average = np.all(low_tail < LOW_SCORE, axis=1)
+
+    counts = np.sum(~np.isnan(low_tail), axis=1)
+    rolling_mean = np.nansum(low_tail, axis=1) / np.maximum(counts, 1)
+    latest = m[:, -1]
+
+    flagged = {}
+    for row in np.flatnonzero(rapid_drop | low_average):
+        criteria = []
+        if rapid_drop[row]:
+            criteria.append(f"rapid drop of {max_drop[row]:g} points")
+        if low_average[row]:
+            criteria.append(f"last {LOW_WINDOW} scores below {LOW_SCORE:g}")
+        flagged[route_ids[row]] = {
+            "latest": float(latest[row]),
+            "max_recent_drop": float(max_drop[row]),
+            "rolling_mean": round(float(rolling_mean[row]), 2),
+            "criteria": criteria,
+        }
+    return flagged
@@ -0,0 +1,160 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from brain.route_monitor import RouteMonitor
+from brain.metrics import log_event
+
+# --- CONFIG ---
+SCHEDULER_ENABLED = os.getenv("SURVEILLANCE_SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+SCHEDULER_INTERVAL = float(os.getenv("SURVEILLANCE_SCHEDULER_INTERVAL", "30"))   # seconds between scans
+SCHEDULER_JITTER = float(os.getenv("SURVEILLANCE_SCHEDULER_JITTER", "0.2"))      # +/- fraction of the interval
+SCHEDULER_MAX_IN_FLIGHT = int(os.getenv("SURVEILLANCE_SCHEDULER_MAX_IN_FLIGHT", "2"))
+SCHEDULER_SHUTDOWN_TIMEOUT = float(os.getenv("SURVEILLANCE_SCHEDULER_SHUTDOWN_TIMEOUT", "10"))
+
+
+class SurveillanceScheduler:
+    """
+    Periodically runs `scan(route_data)` over the routes kept in a RouteMonitor.
+    Each tick only scans routes that received new scores since they were last
+    scanned, ticks are spread out with random jitter, at most `max_in_flight`
+    scans run at once (a tick is skipped when they are all busy), and stop()
+    lets running scans finish for up to `shutdown_timeout` before cancelling them.
+    """
+
+    def __init__(
+        self,
+        scan: Callable[[Dict[str, List[float]]], Awaitable[Dict[str, Any]]],
+        monitor: RouteMonitor,
+        interval: float = SCHEDULER_INTERVAL,
+        jitter: float = SCHEDULER_JITTER,
+        max_in_flight: int = SCHEDULER_MAX_IN_FLIGHT,
+        shutdown_timeout: float = SCHEDULER_SHUTDOWN_TIMEOUT,
+    ):
+        self.scan = scan
+        self.monitor = monitor
+        self.interval = interval
+        self.jitter = jitter
+        self.max_in_flight = max(1, max_in_flight)
+        self.shutdown_timeout = shutdown_timeout
+        self._scanned_versions: Dict[str, int] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.ticks = 0
+        self.scans = 0
+        self.failures = 0
+        self.skipped_unchanged = 0
+        self.skipped_busy = 0
+        self.last_scan: Optional[Dict[str, Any]] = None
+
+    # --- LIFECYCLE ---
+    def start(self) -> None:
+        if self._loop_task is None or self._loop_task.done():
+            self._stopping = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._run())
+            log_event("surveillance_scheduler_started", sampled=False, interval_s=self.interval, jitter=self.jitter)
+
+    async def stop(self) -> None:
+        if self._loop_task is None:
+            return
+        self._stopping.set()
+        await self._loop_task
+        self._loop_task = None
+        if self._in_flight:
+            _, pending = await asyncio.wait(self._in_flight, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        log_event("surveillance_scheduler_stopped", sampled=False)
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=max(delay, 0))
+                return
+            except asyncio.TimeoutError:
+                pass
+            self.tick()
+
+    # --- TICK ---
+    def changed_routes(self) -> Dict[str, int]:
+        """{route_id: version} of routes with scores the scheduler has not scanned yet."""
+        changed = {}
+        for route_id in self.monitor.route_ids():
+            version = self.monitor.version(route_id)
+            if self._scanned_versions.get(route_id) != version:
+                changed[route_id] = version
+        return changed
+
+    def tick(self) -> Optional[asyncio.Task]:
+        self.ticks += 1
+        if len(self._in_flight) >= self.max_in_flight:
+            self.skipped_busy += 1
+            return None
+        changed = self.changed_routes()
+        if not changed:
+            self.skipped_unchanged += 1
+            return None
+
+        # Mark as scanned up front so the next tick does not pick the same versions again
+        previous = {r: self._scanned_versions.get(r) for r in changed}
+        self._scanned_versions.update(changed)
+        task = asyncio.create_task(self._scan(self.monitor.snapshot(changed), previous))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return task
+
+    async def _scan(self, route_data: Dict[str, List[float]], previous: Dict[str, Optional[int]]) -> None:
+        started = time.perf_counter()
+        try:
+            result = await self.scan(route_data)
+        except Exception as e:
+            self.failures += 1
+            self._retry_later(previous, previous)
+            log_event("surveillance_scan_failed", level=logging.ERROR, routes=len(route_data), error=str(e))
+            return
+        # Routes of shards that failed are retried on the next tick as well
+        self._retry_later(previous, result.get("failed_routes", []))
+        self.scans += 1
+        self.last_scan = {
+            "finished_at": time.time(),
+            "duration_s": round(time.perf_counter() - started, 3),
+            "routes": len(route_data),
+            "ai_report": result.get("ai_report"),
+            "flagged_routes": result.get("flagged_routes", []),
+            "suppressed_routes": result.get("suppressed_routes", []),
+            "failed_shards": result.get("failed_shards", 0),
+        }
+
+    def _retry_later(self, previous: Dict[str, Optional[int]], route_ids) -> None:
+        """Restores the scanned versions of `route_ids` so the next tick picks them up again."""
+        for route_id in route_ids:
+            version = previous.get(route_id)
+            if version is None:
+                self._scanned_versions.pop(route_id, None)
+            else:
+                self._scanned_versions[route_id] = version
+
+    def forget(self, route_id: str) -> None:
+        self._scanned_versions.pop(route_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_s": self.interval,
+            "in_flight": len(self._in_flight),
+            "ticks": self.ticks,
+            "scans": self.scans,
+            "failures": self.failures,
+            "skipped_unchanged": self.skipped_unchanged,
+            "skipped_busy": self.skipped_busy,
+            "last_scan": self.last_scan,
+        }
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class FrontendMessage(BaseModel):
+    """One chat message as the frontend / Node server sends it."""
+    userId: str
+    message: str
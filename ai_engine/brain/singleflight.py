@@ -0,0 +1,70 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# --- CONFIG ---
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv("SINGLEFLIGHT_RESULT_TTL", "2"))      # seconds a finished result answers retries
+SINGLEFLIGHT_MAX_RESULTS = int(os.getenv("SINGLEFLIGHT_MAX_RESULTS", "1000"))
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key starts the
+    work, callers arriving while it runs await the same task, and a successful
+    result keeps answering the key for `result_ttl` seconds to absorb late retries.
+    Failures are shared with the callers already waiting but never remembered.
+    """
+
+    def __init__(self, result_ttl: float = SINGLEFLIGHT_RESULT_TTL, max_results: int = SINGLEFLIGHT_MAX_RESULTS):
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.executions = 0
+        self.joined = 0
+        self.replayed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._results.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] <= self.result_ttl:
+                self.replayed += 1
+                return entry[1]
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+        else:
+            self.executions += 1
+            task = self._in_flight[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(key, t))
+        # shield: a caller disconnecting must not cancel the run the others are waiting on
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None or self.result_ttl <= 0:
+            return
+        self._results[key] = (time.monotonic(), task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        calls = self.executions + self.joined + self.replayed
+        return {
+            "in_flight": len(self._in_flight),
+            "results": len(self._results),
+            "executions": self.executions,
+            "joined": self.joined,
+            "replayed": self.replayed,
+            "coalesced_rate": (self.joined + self.replayed) / calls if calls else 0.0,
+        }
+
+
+chat_flights = SingleFlight()
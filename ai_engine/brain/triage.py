@@ -0,0 +1,141 @@
+import os
+import re
+import json
+from typing import Dict, List, Optional
+
+# --- 1. DEFAULT RULES ---
+# Messages that are always safe on their own (compared after normalization)
+SAFE_PHRASES = [
+    "hi", "hii", "hello", "hey", "hi there", "hello there", "hey there",
+    "hello again", "hi again", "hey again",
+    "good morning", "good afternoon", "good evening", "good night",
+    "ok", "okay", "k", "cool", "sure", "yes", "yeah", "yep",
+    "thanks", "thank you", "thank you so much", "thx",
+    "on my way", "omw", "coming", "reached", "i reached", "i have reached",
+    "see you", "see you soon", "bye", "goodbye", "lol", "haha",
+]
+
+SAFE_PATTERNS = [
+    r"^(hi+|hello+|hey+)( (there|again|everyone|all))?$",
+    r"^(ok+|okay+|k+)( (thanks|thank you|cool))?$",
+    r"^(good )?(morning|afternoon|evening|night)( (everyone|all))?$",
+]
+
+# Unambiguous distress phrases: a match is scored critical without the experts.
+# Single keywords ("police", "emergency", "help") are too often harmless
+# ("I'm at the police station", "help me with the homework") and go to the experts,
+# and so do "help"/"following me" without a threat around them ("can you help me?",
+# "thanks for following me on insta").
+_NOT_A_TASK = r"(?!( me)? (with|to|out|on|pick|choose|find|understand|decide|figure|fix|get|carry|move)\b)"
+_FOLLOWER = r"(he|she|they|someone|somebody|a (man|guy|car|stranger)|this (man|guy|car)|some (man|guy))"
+CRITICAL_PATTERNS = [
+    r"^((please|pls|someone|somebody) )?help me\b" + _NOT_A_TASK,
+    r"^(please|pls|someone|somebody) help\b" + _NOT_A_TASK,
+    r"\bcall (the )?police\b",
+    r"\b" + _FOLLOWER + r"('s|'re| is| are| keeps| keep| has been| have been| was| is still)? following me\b",
+    r"\bbeing followed\b",
+    r"\bsos\b",
+]
+
+# A critical phrase preceded (within a few words) by one of these is not distress:
+# "no need to call the police", "nobody is following me"
+NEGATION_PATTERNS = [
+    r"\b(no|not|never|nobody|don'?t|doesn'?t|didn'?t|isn'?t|wasn'?t|stopped|no longer)\b(\W+\w+){0,3}\W*$",
+]
+
+# A refusal from someone else in the room disables the safe shortcut,
+# because a repeated greeting after "Stop" is no longer harmless.
+# "Stop" only counts on its own or aimed at someone: "bus stop" / "can't stop laughing" are chat
+REFUSAL_PATTERNS = [
+    r"^stop\b(?! (by|at|in|over)\b)",
+    r"\b(please|pls|just|i said) stop\b",
+    r"\bstop (texting|messaging|calling|following|contacting|bothering|it|that)\b",
+    r"\bleave me alone\b",
+    r"\bgo away\b",
+    r"\bdon'?t (text|message|call) me\b",
+    r"\bnot interested\b",
+]
+
+# --- 2. CONFIGURATION ---
+# TRIAGE_RULES_PATH may point to a JSON file overriding any of the lists above:
+# {"safe_phrases": [...], "safe_patterns": [...], "critical_patterns": [...],
+#  "negation_patterns": [...], "refusal_patterns": [...]}
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _load_rules() -> Dict[str, List[str]]:
+    rules = {
+        "safe_phrases": SAFE_PHRASES,
+        "safe_patterns": SAFE_PATTERNS,
+        "critical_patterns": CRITICAL_PATTERNS,
+        "negation_patterns": NEGATION_PATTERNS,
+        "refusal_patterns": REFUSAL_PATTERNS,
+    }
+    path = os.getenv("TRIAGE_RULES_PATH")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        for key in rules:
+            if key in overrides:
+                rules[key] = list(overrides[key])
+    return rules
+
+
+_rules = _load_rules()
+_safe_phrases = {p.strip().lower() for p in _rules["safe_phrases"]}
+_safe_patterns = [re.compile(p) for p in _rules["safe_patterns"]]
+_critical_patterns = [re.compile(p) for p in _rules["critical_patterns"]]
+_negation_patterns = [re.compile(p) for p in _rules["negation_patterns"]]
+_refusal_patterns = [re.compile(p) for p in _rules["refusal_patterns"]]
+
+
+# --- 3. CLASSIFIER ---
+def normalize(text: str) -> str:
+    """Lowercases, strips punctuation/emoji at the edges and collapses whitespace."""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return re.sub(r"^[^\w']+|[^\w']+$", "", text)
+
+
+def is_refusal(text: str) -> bool:
+    """True for "Stop" / "Leave me alone" style messages."""
+    text = normalize(text)
+    return any(p.search(text) for p in _refusal_patterns)
+
+
+def _critical_match(text: str) -> Optional[str]:
+    """The first distress pattern matching the normalized text that isn't negated just before."""
+    for pattern in _critical_patterns:
+        for match in pattern.finditer(text):
+            before = text[:match.start()]
+            if not any(n.search(before) for n in _negation_patterns):
+                return pattern.pattern
+    return None
+
+
+def is_critical(text: str) -> bool:
+    """True for messages matching a distress / trigger phrase."""
+    return _critical_match(normalize(text)) is not None
+
+
+def classify(message: str, refused_by_others: bool) -> Optional[Dict[str, str]]:
+    """
+    Returns {"verdict": "safe" | "critical", "rule": <matched rule>} for messages
+    that can be decided locally, or None when the LLM experts are needed.
+    `refused_by_others` is whether someone else in the room has said "Stop".
+    """
+    if not TRIAGE_ENABLED:
+        return None
+
+    text = normalize(message)
+    if not text:
+        return None
+
+    rule = _critical_match(text)
+    if rule is not None:
+        return {"verdict": "critical", "rule": rule}
+
+    is_safe = text in _safe_phrases or any(p.match(text) for p in _safe_patterns)
+    if is_safe and not refused_by_others:
+        return {"verdict": "safe", "rule": text}
+
+    return None
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Any, List, Optional, Sequence, Tuple
+from brain.metrics import log_event
+
+
+class WriteBehind:
+    """
+    Write-behind queue for one SQLite statement. Rows added on the event loop
+    are buffered and committed in one transaction from a worker thread, so the
+    request path never waits on disk; without a running loop (scripts, tests)
+    a row is written at once. Reads run in a worker thread as well: they share
+    the connection lock with the writer, which may hold it for a whole batch.
+    """
+
+    def __init__(self, db: sqlite3.Connection, sql: str):
+        self._db = db
+        self._sql = sql
+        self._lock = threading.Lock()
+        self._pending: List[Sequence[Any]] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+
+    def add(self, row: Sequence[Any]) -> None:
+        self._pending.append(row)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take())
+            return
+        if self._flushing is None or self._flushing.done():
+            self._flushing = loop.create_task(self._flush())
+
+    async def flush(self) -> None:
+        """Waits until every row added so far is on disk."""
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+        if self._pending:
+            await asyncio.to_thread(self._write, self._take())
+
+    async def fetchone(self, sql: str, args: Tuple = ()) -> Optional[Tuple]:
+        return await asyncio.to_thread(self._fetchone, sql, args)
+
+    def _fetchone(self, sql: str, args: Tuple) -> Optional[Tuple]:
+        with self._lock:
+            return self._db.execute(sql, args).fetchone()
+
+    async def _flush(self) -> None:
+        # Rows added while a batch is being written go out with the next one
+        while self._pending:
+            rows = self._take()
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                log_event("sqlite_write_failed", level=logging.ERROR, rows=len(rows), error=str(e))
+
+    def _take(self) -> List[Sequence[Any]]:
+        rows, self._pending = self._pending, []
+        return rows
+
+    def _write(self, rows: List[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(self._sql, rows)
+            self._db.commit()
+        self.written += len(rows)
+        self.batches += 1
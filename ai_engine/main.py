@@ -1,80 +1,388 @@
-from fastapi import FastAPI, HTTPException
+import time
+BOOT_STARTED = time.perf_counter()  # before the heavy imports, for /stats/startup
+
+import os
+import json
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, RootModel
-from typing import List, Dict
-from brain.layel_1 import app_graph, FrontendMessage
-from brain.layel_2 import surveillance_agent
-from brain.agent3 import analyze_emergency,FrontendMessage
-app = FastAPI()
-from langchain_core.messages import AIMessage
+from typing import List, Dict, Optional
+from brain.schemas import FrontendMessage
+from brain.layel_1 import get_chat_graph, degraded_scores, memory, expert_batcher
+from brain.layel_2 import scan_routes
+from brain.agent3 import get_emergency_graph
+from brain.llm_provider import warm_up, registry_stats
+from brain.llm_scheduler import llm_scheduler
+from brain.hedging import hedger
+from brain.expert_cache import expert_cache
+from brain.history_digest import history_digests
+from brain.checkpoint import checkpointer_stats, close_checkpointer, process_rss_bytes
+from brain.route_monitor import route_monitor
+from brain.http_client import close_http_client
+from brain.flag_cooldown import flag_cooldown
+from brain.scheduler import SurveillanceScheduler, SCHEDULER_ENABLED
+from brain.metrics import CallbackMetric, registry, register_stats, log_event
+from brain.outbox import outbox
+from brain.singleflight import chat_flights, SINGLEFLIGHT_ENABLED
+from brain.admission import Overloaded, gates
+
+# Scans routes registered through /agent2/ingest in the background
+surveillance_scheduler = SurveillanceScheduler(scan_routes, route_monitor)
+
+# "Ready" as soon as the app serves; clients and graphs are built behind it
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() in ("1", "true", "yes")
+startup = {"import_s": None, "ready_s": None, "warmup_s": None}
+
+async def warm_models():
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up)
+        get_chat_graph()
+        get_emergency_graph()
+        startup["warmup_s"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        log_event("model_warmup_failed", level=logging.WARNING, error=str(e))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = asyncio.create_task(warm_models()) if MODEL_WARMUP else None
+    outbox.start()
+    if SCHEDULER_ENABLED:
+        surveillance_scheduler.start()
+    startup["ready_s"] = round(time.perf_counter() - BOOT_STARTED, 3)
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await surveillance_scheduler.stop()
+    await finish_emergency_analyses()
+    await outbox.stop()
+    await expert_cache.flush()
+    await flag_cooldown.flush()
+    await close_http_client()
+    await close_checkpointer(memory)
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # 429 = this room is sending too much, 503 = the service as a whole is saturated
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.reason},
+                        headers={"Retry-After": str(exc.retry_after)})
+startup["import_s"] = round(time.perf_counter() - BOOT_STARTED, 3)
 class ChatRequest(BaseModel):
     roomId: str
     messages: List[FrontendMessage]
     currentUserMessage: str
     currentUserId: str
+    mode: Optional[str] = None  # "parallel" or "fused"; defaults to AGENT1_GRAPH_MODE
+
+def chat_state(req: ChatRequest):
+    initial_state = {
+        "roomId": req.roomId,
+        "messages": req.messages,
+        "currentUserMessage": req.currentUserMessage,
+        "currentUserId": req.currentUserId,
+        "final_model_score": None
+    }
+    config = {"configurable": {"thread_id": req.roomId}}
+    return initial_state, config
+
+def chat_graph_for(req: ChatRequest):
+    try:
+        return get_chat_graph(req.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def chat_response(final_state):
+    return {
+        "status": "success",
+        "final_score": final_state["final_model_score"].final_safety_score,
+        "analysis": final_state["final_model_score"].reason,
+        "details": {
+            "sentiment": final_state["model_1"],
+            "urgency": final_state["model_2"],
+            "severity": final_state["model_3"]
+        }
+    }
 
 @app.post("/agent1")
 async def chat_endpoint(req: ChatRequest):
     try:
-        initial_state = {
-            "roomId": req.roomId,
-            "messages": req.messages,
-            "currentUserMessage": req.currentUserMessage,
-            "currentUserId": req.currentUserId
-        }
+        initial_state, config = chat_state(req)
+        chat_graph = chat_graph_for(req)
 
-        config = {"configurable": {"thread_id": req.roomId}}
+        # Queue already deep: answer from local heuristics instead of waiting behind it
+        if gates["agent1"].should_degrade():
+            return {**chat_response(degraded_scores(initial_state)), "degraded": True}
 
-   
-        final_state = await app_graph.ainvoke(initial_state, config=config)
+        async def run():
+            async with gates["agent1"].admit(req.roomId):
+                final_state = await chat_graph.ainvoke(initial_state, config=config)
+            return chat_response(final_state)
 
-    
-        return {
-            "status": "success",
-            "final_score": final_state["final_model_score"].final_safety_score,
-            "analysis": final_state["final_model_score"].reason,
-            "details": {
-                "sentiment": final_state["model_1"],
-                "urgency": final_state["model_2"],
-                "severity": final_state["model_3"]
-            }
-        }
+        if not SINGLEFLIGHT_ENABLED:
+            return await run()
+        # Retried/fanned-out duplicates share one graph run instead of each starting their own
+        key = (req.roomId, req.currentUserMessage, req.currentUserId, req.mode)
+        return await chat_flights.do(key, run)
 
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
-        print(f"Error in Chat Endpoint: {e}")
+        log_event("chat_failed", level=logging.ERROR, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+# State key -> SSE event name, emitted as soon as the node producing it finishes
+STREAM_EVENTS = {
+    "model_1": "sentiment",
+    "model_2": "urgency",
+    "model_3": "severity",
+    "final_model_score": "final",
+}
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/agent1/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    initial_state, config = chat_state(req)
+    chat_graph = chat_graph_for(req)
+    gate = gates["agent1"]
+    degraded = gate.should_degrade()
+    if not degraded:
+        gate.check(req.roomId)  # refuse with a real 429/503 before the stream starts
+
+    async def events():
+        final_state = dict(initial_state)
+        try:
+            if degraded:
+                yield sse("done", {**chat_response(degraded_scores(initial_state)), "degraded": True})
+                return
+            # The slot is taken inside the stream so it is always released with it
+            async with gate.admit(req.roomId):
+                async for update in chat_graph.astream(initial_state, config=config, stream_mode="updates"):
+                    for node, values in update.items():
+                        for key, value in (values or {}).items():
+                            final_state[key] = value
+                            if key in STREAM_EVENTS and value is not None:
+                                yield sse(STREAM_EVENTS[key], {"node": node, "result": value})
+            yield sse("done", chat_response(final_state))
+        except Overloaded as e:
+            yield sse("error", {"detail": e.reason, "status": e.status_code, "retry_after": e.retry_after})
+        except Exception as e:
+            log_event("chat_stream_failed", level=logging.ERROR, error=str(e))
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Counters the caches already keep, exported as Prometheus metrics
+register_stats("ai_engine_expert_cache_lookups_total", "Expert cache lookups by result", "counter",
+               expert_cache.stats, ["hits", "disk_hits", "misses"])
+register_stats("ai_engine_flag_cooldown_total", "Flag cooldown decisions", "counter",
+               flag_cooldown.stats, ["recorded", "suppressed", "escalations"])
+register_stats("ai_engine_expert_batching_total", "Micro-batched expert scoring", "counter",
+               expert_batcher.stats, ["batches", "items"])
+
+register_stats("ai_engine_chat_singleflight_total", "/agent1 calls by how they were answered", "counter",
+               chat_flights.stats, ["executions", "joined", "replayed"])
+
+register_stats("ai_engine_llm_scheduler_calls", "LLM attempts running and queued per priority", "gauge",
+               llm_scheduler.stats, ["in_flight", "queued_emergency", "queued_chat", "queued_surveillance"],
+               label="state")
+
+ADMISSION_RESULTS = ("admitted", "rejected_room", "rejected_full", "timed_out", "degraded")
+registry.register(CallbackMetric(
+    "ai_engine_admission_total", "Admission decisions per endpoint", "counter", ["endpoint", "result"],
+    lambda: {(name, k): v for name, gate in gates.items() for k, v in gate.stats().items() if k in ADMISSION_RESULTS}))
+registry.register(CallbackMetric(
+    "ai_engine_admission_requests", "Requests running and queued per endpoint", "gauge", ["endpoint", "state"],
+    lambda: {(name, k): v for name, gate in gates.items() for k, v in gate.stats().items() if k in ("in_flight", "queued")}))
+
+register_stats("ai_engine_outbox_records", "Backend writes waiting in the outbox", "gauge",
+               outbox.stats, ["pending", "dead"], label="status")
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/expert-cache")
+async def expert_cache_stats():
+    return expert_cache.stats()
+
+@app.get("/stats/expert-batching")
+async def expert_batching_stats():
+    return expert_batcher.stats()
+
+@app.get("/stats/flag-cooldown")
+async def flag_cooldown_stats():
+    return flag_cooldown.stats()
+
+@app.get("/stats/singleflight")
+async def singleflight_stats():
+    return chat_flights.stats()
+
+@app.get("/stats/llm-scheduler")
+async def llm_scheduler_stats():
+    return llm_scheduler.stats()
+
+@app.get("/stats/hedging")
+async def hedging_stats():
+    return hedger.stats()
+
+@app.get("/stats/admission")
+async def admission_stats():
+    return {name: gate.stats() for name, gate in gates.items()}
+
+@app.get("/stats/outbox")
+async def outbox_stats():
+    return outbox.stats()
+
+@app.get("/stats/startup")
+async def startup_stats():
+    return {**startup, "models": registry_stats()}
+
+@app.get("/stats/memory")
+async def memory_stats():
+    return {
+        "rss_bytes": process_rss_bytes(),
+        "checkpointer": checkpointer_stats(memory),
+        "expert_cache_entries": expert_cache.stats()["entries"],
+        "history_digest_rooms": len(history_digests),
+    }
+
 class RouteBatchRequest(BaseModel):
     payload: Dict[str, List[float]]
 
 @app.post("/agent2")
 async def surveillance_scan(req: RouteBatchRequest):
     try:
-        initial_state = {
-            "route_data": req.payload,
-            "messages": []
-        }
-
-        # This was already async, keeping it consistent
-        result = await surveillance_agent.ainvoke(initial_state)
-
-        final_msg = result["messages"][-1].content
+        # Large payloads are split into shards that run concurrently
+        async with gates["agent2"].admit():
+            result = await scan_routes(req.payload)
 
         return {
             "status": "success",
-            "ai_report": final_msg
+            "ai_report": result["ai_report"],
+            "flagged_routes": result["flagged_routes"],
+            "suppressed_routes": result["suppressed_routes"],
+            "suppressed_count": len(result["suppressed_routes"]),
+            "shards": result["shards"],
+            "failed_shards": result["failed_shards"],
+            "failed_routes": result["failed_routes"]  # not scanned: callers can send them again
         }
 
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"Error in Surveillance Endpoint: {e}")
+        log_event("surveillance_failed", level=logging.ERROR, error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+class RouteIngestRequest(BaseModel):
+    scores: Dict[str, List[float]]  # routeId -> only the NEW scores since the last ingest
+
+@app.post("/agent2/ingest")
+async def surveillance_ingest(req: RouteIngestRequest):
+    """Appends new scores to the per-route state and returns the danger events they triggered."""
+    events = []
+    for route_id, scores in req.scores.items():
+        events.extend(route_monitor.ingest(route_id, scores))
+    return {
+        "status": "success",
+        "routes": len(req.scores),
+        "events": events
+    }
+
+@app.get("/agent2/routes/{route_id}")
+async def surveillance_route_state(route_id: str):
+    state = route_monitor.state(route_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Unknown route {route_id}")
+    return state
+
+@app.delete("/agent2/routes/{route_id}")
+async def surveillance_route_remove(route_id: str):
+    if not route_monitor.remove(route_id):
+        raise HTTPException(status_code=404, detail=f"Unknown route {route_id}")
+    surveillance_scheduler.forget(route_id)
+    return {"status": "removed", "routeId": route_id}
+
+@app.get("/agent2/events")
+async def surveillance_events(limit: int = 100):
+    return list(route_monitor.events)[-limit:]
+
+@app.get("/stats/route-monitor")
+async def route_monitor_stats():
+    return route_monitor.stats()
+
+@app.get("/stats/scheduler")
+async def scheduler_stats():
+    return surveillance_scheduler.stats()
+
 class ThrottleRequest(BaseModel):
     userId: str
     routeId: str
     message: List[FrontendMessage] 
+    mode: Optional[str] = None  # "immediate" or "sync"; defaults to THROTTLE_MODE
+
+# Both modes first store + forward the raw alert, and the analysis enriches it by alertId.
+# "sync" (default): answer only after the analysis, so the response carries ai_analysis
+# "immediate": answer at once (ai_analysis is null) and enrich the stored alert later;
+# callers opt in per request or via THROTTLE_MODE
+THROTTLE_MODE = os.getenv("THROTTLE_MODE", "sync")
+THROTTLE_SHUTDOWN_TIMEOUT = float(os.getenv("THROTTLE_SHUTDOWN_TIMEOUT", "10"))
+emergency_analyses = set()
+
+async def analyze_in_background(initial_state):
+    try:
+        await get_emergency_graph().ainvoke(initial_state)
+    except Exception as e:
+        log_event("emergency_analysis_failed", level=logging.ERROR, alert=initial_state["alertId"], error=str(e))
+
+async def finish_emergency_analyses():
+    """On shutdown, give running analyses a moment to queue their enrichment."""
+    if emergency_analyses:
+        _, pending = await asyncio.wait(emergency_analyses, timeout=THROTTLE_SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+
+def store_raw_alert(req: ThrottleRequest):
+    """Local write only: the outbox forwards the raw alert to the backend, keyed by its alertId."""
+    alert_id = uuid.uuid4().hex
+    timestamp = datetime.now(timezone.utc).isoformat()
+    outbox.enqueue("/api/room/throttle-room", {
+        "alertId": alert_id,
+        "triggeredByUserId": req.userId,
+        "routeId": req.routeId,
+        "alertLevel": "HIGH",
+        "timestamp": timestamp
+    })
+    return alert_id, timestamp
+
+def analyze_later(initial_state, alert_id: str, timestamp: str):
+    """Runs the analysis after the response; it enriches the already stored alert."""
+    task = asyncio.create_task(analyze_in_background({**initial_state, "alertId": alert_id}))
+    emergency_analyses.add(task)
+    task.add_done_callback(emergency_analyses.discard)
+
+    return {
+        "status": "Emergency Marked",
+        "alertId": alert_id,
+        "timestamp": timestamp,
+        "ai_analysis": None,
+        "analysis_pending": True
+    }
 
 @app.post("/throttle")
 async def throttle_push(req: ThrottleRequest):
+    mode = req.mode or THROTTLE_MODE
+    if mode not in ("immediate", "sync"):
+        raise HTTPException(status_code=400, detail=f"Unknown throttle mode: {mode}")
     try:
         
         initial_state = {
@@ -84,16 +392,40 @@ async def throttle_push(req: ThrottleRequest):
             "context": None          
         }
 
-        # 3. Invoke the graph
-        result = await analyze_emergency.ainvoke(initial_state)
+        # 1. The raw alert is stored before anything can fail or wait, in both modes
+        alert_id, timestamp = store_raw_alert(req)
+
+        if mode == "immediate":
+            return analyze_later(initial_state, alert_id, timestamp)
+
+        # 2. Invoke the graph (bounded: only this mode holds the request open on the LLM);
+        # it enriches the stored alert. When the gate is full the analysis runs later instead
+        try:
+            async with gates["throttle"].admit():
+                result = await get_emergency_graph().ainvoke({**initial_state, "alertId": alert_id})
+        except Overloaded as e:
+            log_event("throttle_overloaded", level=logging.WARNING, user=req.userId, reason=e.reason)
+            return {**analyze_later(initial_state, alert_id, timestamp), "degraded": True}
+        except Exception as e:
+            # The alert itself is already on its way to the backend, only the analysis is missing
+            log_event("throttle_analysis_failed", level=logging.ERROR, alert=alert_id, error=str(e))
+            return {
+                "status": "Emergency Marked",
+                "alertId": alert_id,
+                "timestamp": timestamp,
+                "ai_analysis": None,
+                "analysis_failed": True
+            }
         
         final_msg = result.get("context", "No analysis generated")
 
         return {
             "status": "Emergency Marked",
+            "alertId": alert_id,
+            "timestamp": timestamp,
             "ai_analysis": final_msg
         }
 
     except Exception as e:
-        print(f"Error in throttle agent: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        log_event("throttle_failed", level=logging.ERROR, error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the app the way main.py does (`from brain...`) and never call Gemini
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_MODE", "stub")
+os.environ.setdefault("MODEL_WARMUP", "false")
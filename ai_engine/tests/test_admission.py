@@ -0,0 +1,130 @@
+import time
+import asyncio
+import contextlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from brain.admission import AdmissionGate, Overloaded
+from brain.outbox import Outbox
+
+
+def test_overloaded_sync_throttle_is_queued_not_refused(tmp_path, monkeypatch):
+    box = Outbox(db_path=str(tmp_path / "outbox.db"))
+    analysed = []
+
+    @contextlib.asynccontextmanager
+    async def full():
+        raise Overloaded(503, "throttle is overloaded", 5)
+        yield
+
+    async def analyse(state):
+        analysed.append(state["alertId"])
+
+    monkeypatch.setattr(main, "outbox", box)
+    monkeypatch.setattr(main, "analyze_in_background", analyse)
+    monkeypatch.setattr(main.gates["throttle"], "admit", full)
+
+    response = TestClient(main.app).post("/throttle", json={
+        "userId": "u1", "routeId": "r1", "message": [{"userId": "u1", "message": "help"}], "mode": "sync"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["degraded"] and body["analysis_pending"]
+    assert box.stats()["pending"] == 1
+    assert analysed == [body["alertId"]]
+
+
+def test_room_over_its_limit_gets_429():
+    gate = AdmissionGate("agent1", max_in_flight=8, max_queue=8, queue_timeout=1, room_limit=1)
+
+    async def run():
+        async with gate.admit("room-1"):
+            with pytest.raises(Overloaded) as refused:
+                async with gate.admit("room-1"):
+                    pass
+            async with gate.admit("room-2"):
+                pass
+        return refused.value
+
+    refused = asyncio.run(run())
+    assert refused.status_code == 429 and refused.retry_after >= 1
+    assert gate.stats()["rejected_room"] == 1
+
+
+def test_full_queue_gets_503():
+    gate = AdmissionGate("agent2", max_in_flight=1, max_queue=0, queue_timeout=1)
+
+    async def run():
+        async with gate.admit():
+            with pytest.raises(Overloaded) as refused:
+                async with gate.admit():
+                    pass
+        return refused.value
+
+    assert asyncio.run(run()).status_code == 503
+    assert gate.stats()["rejected_full"] == 1
+
+
+def test_queue_wait_past_the_deadline_gets_503():
+    gate = AdmissionGate("agent2", max_in_flight=1, max_queue=1, queue_timeout=0.05)
+
+    async def run():
+        async with gate.admit():
+            with pytest.raises(Overloaded) as refused:
+                async with gate.admit():
+                    pass
+        return refused.value
+
+    refused = asyncio.run(run())
+    assert refused.status_code == 503 and "queue wait" in refused.reason
+    assert gate.stats()["timed_out"] == 1
+    assert gate.stats()["queued"] == 0 and gate.stats()["in_flight"] == 0
+
+
+def test_refusal_carries_retry_after(monkeypatch):
+    @contextlib.asynccontextmanager
+    async def busy_room(room=None):
+        raise Overloaded(429, f"Too many concurrent requests for room {room}", 7)
+        yield
+
+    monkeypatch.setattr(main.gates["agent1"], "admit", busy_room)
+    response = TestClient(main.app).post("/agent1", json={
+        "roomId": "room-1", "messages": [], "currentUserMessage": "where are you", "currentUserId": "u1"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_sync_throttle_waits_at_most_half_a_second_for_a_slot(tmp_path, monkeypatch):
+    gate = main.gates["throttle"]
+    assert gate.queue_timeout <= 0.5
+
+    class SlowGraph:
+        async def ainvoke(self, state):
+            await asyncio.sleep(5)
+
+    async def analyse(state):
+        pass
+
+    monkeypatch.setattr(main, "outbox", Outbox(db_path=str(tmp_path / "outbox.db")))
+    monkeypatch.setattr(main, "analyze_in_background", analyse)
+    monkeypatch.setattr(main, "get_emergency_graph", SlowGraph)
+    monkeypatch.setattr(gate, "max_in_flight", 1)
+    body = {"userId": "u1", "routeId": "r1", "message": [], "mode": "sync"}
+
+    async def run():
+        import httpx
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ai-engine") as client:
+            busy = asyncio.create_task(client.post("/throttle", json=body))
+            await asyncio.sleep(0.05)
+            started = time.monotonic()
+            response = await client.post("/throttle", json=body)
+            busy.cancel()
+            return response, time.monotonic() - started
+
+    response, waited = asyncio.run(run())
+    assert response.status_code == 200 and response.json()["degraded"]
+    assert waited < 1
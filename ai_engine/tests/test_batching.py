@@ -0,0 +1,44 @@
+import asyncio
+
+from brain import layel_1
+from brain.batching import BatchMiss, MicroBatcher
+from brain.schemas import FrontendMessage
+
+
+def test_items_in_one_window_share_a_batch():
+    batches = []
+
+    async def score_batch(items):
+        batches.append(items)
+        return {item: item.upper() for item in items if item != "dropped"}
+
+    batcher = MicroBatcher(score_batch, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"), batcher.submit("dropped"),
+                                    return_exceptions=True)
+
+    a, b, dropped = asyncio.run(run())
+    assert (a, b) == ("A", "B")
+    assert isinstance(dropped, BatchMiss)
+    assert batches == [["a", "b", "dropped"]]
+
+
+def test_batch_miss_falls_back_to_a_single_call(monkeypatch):
+    async def score_batch(items):
+        return {}
+
+    class Engine:
+        calls = 0
+
+        async def ainvoke(self, prompt):
+            Engine.calls += 1
+            return FrontendMessage(userId="expert", message=prompt)
+
+    monkeypatch.setattr(layel_1, "BATCH_ENABLED", True)
+    monkeypatch.setattr(layel_1, "CACHE_ENABLED", False)
+    monkeypatch.setattr(layel_1, "expert_batcher", MicroBatcher(score_batch, max_wait_ms=1))
+
+    result = asyncio.run(layel_1.cached_expert("urgency", FrontendMessage, Engine(), "where are you", "prompt"))
+    assert result.message == "prompt"
+    assert Engine.calls == 1
@@ -0,0 +1,67 @@
+import asyncio
+
+from brain.checkpoint import BoundedMemorySaver, _build_sqlite_saver
+from brain.layel_1 import graph
+from brain.schemas import FrontendMessage
+
+
+def run_room(app, room, turns=2):
+    async def run():
+        for turn in range(turns):
+            state = {
+                "roomId": room,
+                "messages": [FrontendMessage(userId="u1", message=f"see you at the park, turn {turn}")],
+                "currentUserMessage": f"see you at the park, turn {turn}",
+                "currentUserId": "u1",
+                "final_model_score": None,
+            }
+            await app.ainvoke(state, config={"configurable": {"thread_id": room}})
+    return run
+
+
+def test_bounded_saver_prunes_and_evicts_idle_rooms():
+    saver = BoundedMemorySaver(max_checkpoints_per_thread=2, idle_ttl=3600)
+    app = graph.compile(checkpointer=saver)
+    asyncio.run(run_room(app, "room-a")())
+    asyncio.run(run_room(app, "room-b")())
+
+    for room in ("room-a", "room-b"):
+        assert all(len(checkpoints) <= 2 for checkpoints in saver.storage[room].values())
+    assert saver.pruned_checkpoints > 0
+    # Only channel values of the remaining checkpoints are kept
+    assert all(key in saver.blobs for keys in saver._blob_keys.values() for key in keys)
+
+    saver.idle_ttl = 0
+    assert saver.evict(keep="room-b") == 1
+    assert "room-a" not in saver.storage
+    assert "room-b" in saver.storage
+    assert not any(key[0] == "room-a" for key in saver.blobs)
+    assert saver.stats()["threads"] == 1
+
+
+def test_sqlite_saver_prunes_and_evicts_idle_rooms(tmp_path):
+    async def run():
+        saver = _build_sqlite_saver(str(tmp_path / "checkpoints.sqlite"), max_checkpoints_per_thread=2, idle_ttl=3600)
+        app = graph.compile(checkpointer=saver)
+        try:
+            await run_room(app, "room-a")()
+            await run_room(app, "room-b")()
+
+            async with saver.conn.execute(
+                "SELECT thread_id, checkpoint_ns, COUNT(*) FROM checkpoints GROUP BY thread_id, checkpoint_ns"
+            ) as cur:
+                counts = await cur.fetchall()
+            assert {row[0] for row in counts} == {"room-a", "room-b"}
+            assert all(row[2] <= 2 for row in counts)
+
+            async with saver.conn.execute(
+                "UPDATE thread_activity SET last_used = 0 WHERE thread_id = 'room-a'"
+            ):
+                pass
+            assert await saver.aevict() == 1
+            async with saver.conn.execute("SELECT DISTINCT thread_id FROM checkpoints") as cur:
+                assert [row[0] for row in await cur.fetchall()] == ["room-b"]
+        finally:
+            await saver.aclose()
+
+    asyncio.run(run())
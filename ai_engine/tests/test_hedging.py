@@ -0,0 +1,62 @@
+import asyncio
+
+from brain.hedging import Hedger
+
+
+def test_call_waiting_for_a_slot_is_not_hedged():
+    hedger = Hedger(default_delay_ms=100)
+    sends = []
+
+    async def call(mark_sent):
+        await asyncio.sleep(0.2)  # queued behind a saturated scheduler
+        mark_sent()
+        sends.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(hedger.run("final_judge", call)) == "ok"
+    assert hedger.hedges == 0
+    assert len(sends) == 1
+
+
+def two_requests(first_delay, second_delay, second_fails=False):
+    """A call whose first request answers after `first_delay` and the duplicate after `second_delay`."""
+    sent = []
+
+    async def call(mark_sent):
+        index = len(sent)
+        mark_sent()
+        sent.append(index)
+        await asyncio.sleep(first_delay if index == 0 else second_delay)
+        if index == 1 and second_fails:
+            raise RuntimeError("backup failed")
+        return "primary" if index == 0 else "backup"
+
+    return call, sent
+
+
+def test_first_success_wins():
+    hedger = Hedger(default_delay_ms=20)
+    call, sent = two_requests(0.3, 0.01)
+    assert asyncio.run(hedger.run("final_judge", call)) == "backup"
+    assert hedger.backup_wins == 1
+
+
+def test_failed_backup_does_not_beat_a_slower_success():
+    hedger = Hedger(default_delay_ms=20)
+    call, sent = two_requests(0.1, 0.01, second_fails=True)
+    assert asyncio.run(hedger.run("final_judge", call)) == "primary"
+    assert hedger.backup_wins == 0
+
+
+def test_budget_caps_the_duplicates():
+    hedger = Hedger(default_delay_ms=10, budget=0, burst=1)
+
+    async def run():
+        for _ in range(3):
+            call, _ = two_requests(0.05, 0.05)
+            await hedger.run("final_judge", call)
+
+    asyncio.run(run())
+    assert hedger.hedges == 1
+    assert hedger.over_budget == 2
@@ -0,0 +1,54 @@
+from brain.history_digest import RoomDigest
+from brain.schemas import FrontendMessage
+
+
+def chat(n, start=0):
+    return [FrontendMessage(userId=f"u{i % 2}", message=f"message number {i}") for i in range(start, start + n)]
+
+
+def test_sliding_window_keeps_earlier_refusal():
+    history = [FrontendMessage(userId="u1", message="Stop messaging me")] + chat(20)
+    digest = RoomDigest(window=10)
+    # The client only ever sends the newest 10 messages
+    for end in range(1, len(history) + 1):
+        digest.update(history[max(0, end - 10):end])
+
+    assert digest.seen == len(history)
+    assert digest.refusal_count == 1
+    assert digest.refused_by_others("u0")
+    assert not digest.refused_by_others("u1")
+    assert list(digest.recent) == [(m.userId, m.message) for m in history[-10:]]
+
+
+def test_repeated_window_is_not_counted_twice():
+    digest = RoomDigest(window=10)
+    window = chat(9) + [FrontendMessage(userId="u0", message="stop")]
+    digest.update(window)
+    digest.update(window)
+    assert digest.seen == 10
+    assert digest.refusal_count == 1
+
+
+def test_full_history_is_consumed_incrementally():
+    digest = RoomDigest(window=10)
+    history = chat(30)
+    digest.update(history[:15])
+    digest.update(history)
+    assert digest.seen == 30
+    assert list(digest.recent) == [(m.userId, m.message) for m in history[-10:]]
+
+
+def test_gap_larger_than_window_counts_all_new_messages():
+    digest = RoomDigest(window=10)
+    digest.update(chat(10))
+    digest.update(chat(10, start=50))
+    assert digest.seen == 20
+
+
+def test_stop_in_ordinary_chat_is_not_recorded_as_refusal():
+    digest = RoomDigest(window=10)
+    digest.update([FrontendMessage(userId="u1", message="I am at the bus stop"),
+                   FrontendMessage(userId="u1", message="can't stop laughing")])
+    assert digest.refusal_count == 0
+    assert not digest.refused_by_others("u0")
+    assert digest.summary() == ""
@@ -0,0 +1,38 @@
+from brain import history_window
+from brain.history_window import (
+    EMERGENCY_HISTORY_TOKENS, JUDGE_HISTORY_EXTRAS, JUDGE_HISTORY_MESSAGES, JUDGE_HISTORY_TOKENS,
+)
+from brain.schemas import FrontendMessage
+
+
+def room(n):
+    return [FrontendMessage(userId=f"u{i % 2}", message=f"msg {i}") for i in range(n)]
+
+
+def judge_window(messages):
+    return history_window.render(messages, JUDGE_HISTORY_TOKENS,
+                                 max_recent=JUDGE_HISTORY_MESSAGES, max_extra=JUDGE_HISTORY_EXTRAS)
+
+
+def message_lines(rendered):
+    return [line for line in rendered.splitlines() if not line.startswith("(...")]
+
+
+def test_judge_sees_the_newest_messages_not_the_whole_room():
+    messages = room(200)
+    lines = message_lines(judge_window(messages))
+    assert lines == [f"[u{i % 2}]: msg {i}" for i in range(190, 200)]
+
+
+def test_judge_keeps_a_few_older_high_risk_messages():
+    messages = room(200)
+    for i in (5, 50, 100, 150):
+        messages[i] = FrontendMessage(userId="u1", message="someone is following me")
+    lines = message_lines(judge_window(messages))
+    assert len(lines) == JUDGE_HISTORY_MESSAGES + JUDGE_HISTORY_EXTRAS
+    assert lines.count("[u1]: someone is following me") == JUDGE_HISTORY_EXTRAS
+
+
+def test_emergency_window_is_bounded_only_by_tokens():
+    lines = message_lines(history_window.render(room(200), EMERGENCY_HISTORY_TOKENS))
+    assert len(lines) > JUDGE_HISTORY_MESSAGES + JUDGE_HISTORY_EXTRAS
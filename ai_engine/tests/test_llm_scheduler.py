@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from brain.llm_scheduler import CHAT, EMERGENCY, SURVEILLANCE, LLMScheduler
+
+
+def test_waiting_calls_are_served_by_priority():
+    scheduler = LLMScheduler(max_concurrency=1, emergency_reserve=0)
+    order = []
+
+    async def call(priority):
+        await scheduler.acquire(priority)
+        order.append(priority)
+        scheduler.release()
+
+    async def run():
+        await scheduler.acquire(CHAT)
+        waiters = [asyncio.create_task(call(p)) for p in (SURVEILLANCE, CHAT, EMERGENCY)]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+    assert order == [EMERGENCY, CHAT, SURVEILLANCE]
+
+
+def test_reserved_slot_is_only_used_by_emergencies():
+    scheduler = LLMScheduler(max_concurrency=3, emergency_reserve=1)
+
+    async def run():
+        await scheduler.acquire(CHAT)
+        await scheduler.acquire(CHAT)
+        chat = asyncio.create_task(scheduler.acquire(CHAT))
+        await asyncio.sleep(0)
+        assert not chat.done()
+        await asyncio.wait_for(scheduler.acquire(EMERGENCY), timeout=1)
+        assert scheduler.stats()["in_flight"] == 3
+        chat.cancel()
+
+    asyncio.run(run())
+
+
+def test_cancel_racing_a_grant_returns_the_slot():
+    scheduler = LLMScheduler(max_concurrency=1, emergency_reserve=0)
+
+    async def run():
+        await scheduler.acquire(CHAT)
+        waiter = asyncio.create_task(scheduler.acquire(CHAT))
+        await asyncio.sleep(0)
+        scheduler.release()  # hands the slot to the waiter...
+        waiter.cancel()      # ...which is cancelled before it runs
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.stats()["in_flight"] == 0
+        await asyncio.wait_for(scheduler.acquire(CHAT), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_rate_tokens_refill_over_time():
+    scheduler = LLMScheduler(max_concurrency=4, emergency_reserve=0, rate_per_minute=600, burst=1)
+
+    async def run():
+        await scheduler.acquire(CHAT)
+        scheduler.release()
+        started = time.monotonic()
+        await scheduler.acquire(CHAT)  # the single token is spent: wait ~0.1s for the next one
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.08
+    assert scheduler.throttled == 1
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from brain import outbox as outbox_module
+from brain.outbox import Outbox
+
+
+def test_database_is_created_on_first_use(tmp_path):
+    path = tmp_path / "outbox.db"
+    box = Outbox(db_path=str(path))
+    assert not path.exists()
+
+    record_id = box.enqueue("/api/room/throttle-room", {"alertLevel": "HIGH"})
+    assert os.path.exists(path)
+    assert record_id == 1
+    assert box.stats()["pending"] == 1
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.is_success = 200 <= status_code < 300
+
+
+class FakeClient:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.posts = 0
+
+    async def post(self, endpoint, **kwargs):
+        self.posts += 1
+        return FakeResponse(self.statuses.pop(0))
+
+
+def next_attempt_in(box, record_id):
+    row = box._db.execute("SELECT next_attempt, attempts FROM outbox WHERE id = ?", (record_id,)).fetchone()
+    return row[0] - time.time(), row[1]
+
+
+def make_due(box, record_id):
+    box._db.execute("UPDATE outbox SET next_attempt = 0 WHERE id = ?", (record_id,))
+
+
+def test_failed_delivery_is_retried_with_growing_backoff(tmp_path, monkeypatch):
+    client = FakeClient(503, 503, 200)
+    monkeypatch.setattr(outbox_module, "get_http_client", lambda: client)
+    monkeypatch.setattr(outbox_module, "OUTBOX_BACKOFF_S", 10)
+    box = Outbox(db_path=str(tmp_path / "outbox.db"))
+    record_id = box.enqueue("/api/room/throttle-room", {"alertLevel": "HIGH"})
+
+    asyncio.run(box.deliver_due())
+    delay, attempts = next_attempt_in(box, record_id)
+    assert attempts == 1 and 7 < delay <= 12
+    asyncio.run(box.deliver_due())  # not due yet: nothing is sent
+    assert client.posts == 1
+
+    make_due(box, record_id)
+    asyncio.run(box.deliver_due())
+    delay, attempts = next_attempt_in(box, record_id)
+    assert attempts == 2 and 15 < delay <= 24
+
+    make_due(box, record_id)
+    asyncio.run(box.deliver_due())
+    assert box.stats()["pending"] == 0
+    assert box.delivered == 1 and box.failed_attempts == 2
+
+
+def test_permanent_rejection_is_parked_not_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(outbox_module, "get_http_client", lambda: FakeClient(400))
+    box = Outbox(db_path=str(tmp_path / "outbox.db"))
+    box.enqueue("/api/room/throttle-room", {"alertLevel": "HIGH"})
+
+    asyncio.run(box.deliver_due())
+    assert box.stats()["pending"] == 0
+    assert box.stats()["dead"] == 1
+
+
+def post_throttle(monkeypatch, box, graph=None):
+    import main
+    from brain import agent3
+
+    monkeypatch.setattr(main, "outbox", box)
+    monkeypatch.setattr(agent3, "outbox", box)
+    if graph is not None:
+        monkeypatch.setattr(main, "get_emergency_graph", lambda: graph)
+    response = TestClient(main.app).post("/throttle", json={
+        "userId": "u1", "routeId": "r1", "message": [{"userId": "u1", "message": "he is following me"}],
+        "mode": "sync"})
+    rows = box._db.execute("SELECT endpoint, payload FROM outbox ORDER BY id").fetchall()
+    return response, [(endpoint, json.loads(payload)) for endpoint, payload in rows]
+
+
+def test_sync_throttle_stores_the_alert_before_the_analysis(tmp_path, monkeypatch):
+    response, rows = post_throttle(monkeypatch, Outbox(db_path=str(tmp_path / "outbox.db")))
+
+    assert response.status_code == 200
+    alert_id = response.json()["alertId"]
+    assert response.json()["ai_analysis"]
+    assert [endpoint for endpoint, _ in rows] == ["/api/room/throttle-room", "/api/room/throttle-room/enrich"]
+    assert all(payload["alertId"] == alert_id for _, payload in rows)
+
+
+def test_sync_throttle_keeps_the_alert_when_the_analysis_fails(tmp_path, monkeypatch):
+    class FailingGraph:
+        async def ainvoke(self, state):
+            raise RuntimeError("Gemini unavailable")
+
+    response, rows = post_throttle(monkeypatch, Outbox(db_path=str(tmp_path / "outbox.db")), FailingGraph())
+
+    assert response.status_code == 200
+    assert response.json()["analysis_failed"]
+    assert [payload["alertId"] for _, payload in rows] == [response.json()["alertId"]]
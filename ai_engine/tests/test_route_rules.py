@@ -0,0 +1,38 @@
+import pytest
+
+from brain.route_rules import evaluate
+
+
+@pytest.mark.parametrize("scores", [
+    [9, 9, 5],               # one big step
+    [10, 8, 6, 4, 2],        # steady decline
+    [9, 7.5, 6, 4.5, 3],
+    [8, 8, 7, 6, 5],         # 3 points under the recent peak
+])
+def test_drops_are_flagged(scores):
+    findings = evaluate({"r1": scores})["r1"]
+    assert any("rapid drop" in c for c in findings["criteria"])
+    assert findings["latest"] == scores[-1]
+
+
+def test_low_scores_are_flagged():
+    findings = evaluate({"r1": [4, 4.5, 3]})["r1"]
+    assert findings["criteria"] == ["last 3 scores below 5"]
+    assert findings["rolling_mean"] == 3.83
+
+
+@pytest.mark.parametrize("scores", [
+    [9, 9, 9, 9],
+    [10, 9, 8.5, 8],         # slow drift, under the threshold
+    [2, 9, 9, 9, 9],         # old drop, then recovered
+    [5, 6, 7],               # rising
+    [4],                     # too few scores for either rule
+])
+def test_clean_routes_are_not_flagged(scores):
+    assert evaluate({"r1": scores}) == {}
+
+
+def test_routes_are_evaluated_independently():
+    flagged = evaluate({"clean": [9, 9, 9], "falling": [10, 8, 6, 4], "empty": []})
+    assert list(flagged) == ["falling"]
+    assert flagged["falling"]["max_recent_drop"] == 6
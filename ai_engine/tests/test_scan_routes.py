@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from brain import layel_2
+
+
+class FakeAgent:
+    async def ainvoke(self, state):
+        route = next(iter(state["route_data"]))
+        if route == "bad":
+            raise RuntimeError("analyst failed")
+        return {"messages": [AIMessage(content=f"flagged {route}")], "flagged_routes": [route]}
+
+
+def test_failed_shard_keeps_the_others(monkeypatch):
+    monkeypatch.setattr(layel_2, "SHARD_SIZE", 1)
+    monkeypatch.setattr(layel_2, "get_surveillance_agent", FakeAgent)
+
+    result = asyncio.run(layel_2.scan_routes({"r1": [2.0], "bad": [2.0], "r2": [2.0]}))
+
+    assert result["flagged_routes"] == ["r1", "r2"]
+    assert result["failed_shards"] == 1
+    assert result["failed_routes"] == ["bad"]
+    assert "1 of 3 shards" in result["ai_report"]
+
+
+def test_all_shards_failing_raises(monkeypatch):
+    monkeypatch.setattr(layel_2, "get_surveillance_agent", FakeAgent)
+    with pytest.raises(RuntimeError):
+        asyncio.run(layel_2.scan_routes({"bad": [2.0]}))
+
+
+def test_agent2_reports_the_routes_it_could_not_scan(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(layel_2, "SHARD_SIZE", 1)
+    monkeypatch.setattr(layel_2, "get_surveillance_agent", FakeAgent)
+
+    response = TestClient(main.app).post("/agent2", json={"payload": {"r1": [2.0], "bad": [2.0]}})
+
+    assert response.status_code == 200
+    assert response.json()["failed_shards"] == 1
+    assert response.json()["failed_routes"] == ["bad"]
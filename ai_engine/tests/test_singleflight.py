@@ -0,0 +1,44 @@
+import asyncio
+
+from brain.singleflight import SingleFlight
+
+
+def test_concurrent_callers_join_one_run_and_late_retries_replay():
+    flights = SingleFlight(result_ttl=60)
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return {"final_score": 7}
+
+    async def run():
+        first, second = await asyncio.gather(flights.do("key", work), flights.do("key", work))
+        third = await flights.do("key", work)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == second == third
+    assert len(runs) == 1
+    assert (flights.executions, flights.joined, flights.replayed) == (1, 1, 1)
+
+
+def test_failures_are_shared_but_not_remembered():
+    flights = SingleFlight(result_ttl=60)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise RuntimeError("LLM down")
+        return "ok"
+
+    async def run():
+        results = await asyncio.gather(flights.do("key", flaky), flights.do("key", flaky), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await flights.do("key", flaky)
+
+    assert asyncio.run(run()) == "ok"
+    assert len(calls) == 2
+    assert flights.replayed == 0
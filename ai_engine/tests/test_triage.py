@@ -0,0 +1,66 @@
+import pytest
+from brain.triage import classify, is_refusal
+
+
+@pytest.mark.parametrize("message", [
+    "help me",
+    "HELP ME!!",
+    "help me please",
+    "Please help, he won't leave",
+    "someone help",
+    "someone is following me",
+    "he's following me",
+    "a man keeps following me home",
+    "I think I'm being followed",
+    "call the police!!",
+    "SOS",
+])
+def test_distress_phrases_are_critical(message):
+    assert classify(message, refused_by_others=False)["verdict"] == "critical"
+
+
+@pytest.mark.parametrize("message", [
+    "I am at the police station, all good",
+    "no need to call police, I am fine",
+    "help me with the homework",
+    "emergency exit is on the left",
+    "nobody is following me, relax",
+    "don't call the police",
+    "thanks for following me on insta",
+    "are you following me on twitter?",
+    "can you help me?",
+    "could you please help me move the couch",
+    "help me pick a movie",
+])
+def test_ambiguous_or_negated_messages_go_to_the_experts(message):
+    assert classify(message, refused_by_others=False) is None
+
+
+def test_greeting_after_refusal_is_not_safe():
+    assert classify("hello", refused_by_others=False)["verdict"] == "safe"
+    assert classify("hello", refused_by_others=True) is None
+
+
+@pytest.mark.parametrize("message", [
+    "Stop",
+    "STOP!!",
+    "stop, seriously",
+    "please stop",
+    "I said stop",
+    "Stop messaging me",
+    "can you stop following me",
+    "just stop it",
+])
+def test_refusals(message):
+    assert is_refusal(message)
+
+
+@pytest.mark.parametrize("message", [
+    "I am at the bus stop",
+    "can't stop laughing",
+    "stop by the shop later?",
+    "next stop is mine",
+    "the music won't stop",
+])
+def test_stop_in_ordinary_chat_is_not_a_refusal(message):
+    assert not is_refusal(message)
@@ -0,0 +1,61 @@
+import asyncio
+
+from brain.expert_cache import ExpertCache
+from brain.flag_cooldown import FlagCooldown
+from brain.schemas import FrontendMessage
+
+
+def test_expert_cache_writes_in_batches_off_the_loop(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ExpertCache(db_path=path)
+
+    async def run():
+        for i in range(5):
+            cache.set("urgency", f"message {i}", FrontendMessage(userId="u1", message=str(i)))
+        # Nothing was written on the loop itself
+        assert cache._disk.written == 0
+        await cache.flush()
+
+    asyncio.run(run())
+    assert cache._disk.written == 5
+    assert cache._disk.batches < 5
+
+    reloaded = ExpertCache(db_path=path)
+    assert asyncio.run(reloaded.get("urgency", "message 3", FrontendMessage)).message == "3"
+    assert reloaded.stats()["disk_hits"] == 1
+
+
+def test_flag_cooldown_survives_restart(tmp_path):
+    path = str(tmp_path / "cooldown.sqlite")
+    cooldown = FlagCooldown(db_path=path)
+
+    async def run():
+        await cooldown.record("route-1", 2.0)
+        await cooldown.flush()
+
+    asyncio.run(run())
+    assert not asyncio.run(FlagCooldown(db_path=path).should_flag("route-1", 2.0))
+
+
+def test_disk_lookup_does_not_block_the_loop_during_a_batch_commit(tmp_path):
+    cache = ExpertCache(db_path=str(tmp_path / "cache.sqlite"))
+
+    async def run():
+        cache._disk._lock.acquire()  # the writer thread is in the middle of a commit
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker = asyncio.create_task(tick())
+        lookup = asyncio.create_task(cache.get("urgency", "missing", FrontendMessage))
+        await asyncio.sleep(0.05)
+        assert ticks > 1 and not lookup.done()
+        cache._disk._lock.release()
+        assert await lookup is None
+        ticker.cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import { db } from "../firebaseadmin/firebaseadmin.js";
+
+// Firestore allows at most 500 writes per batch
+const BATCH_LIMIT = 500;
+
+const flag_rooms=async(req,res)=>{
+    const { rooms } = req.body;
+    try {
+            if (!Array.isArray(rooms) || rooms.length === 0) {
+            return res.status(400).json({
+                status: "error",
+                message: "rooms must be a non-empty array",
+            });
+            }
+            const invalid = rooms.filter(r => !r || !r.roomId || !r.severity || !r.ai_reason);
+            if (invalid.length > 0) {
+            return res.status(400).json({
+                status: "error",
+                message: "Missing required fields",
+            });
+            }
+
+            const collection = db.collection("women").doc("flaggedRoom").collection("rooms");
+            const createdAt = new Date();
+            for (let i = 0; i < rooms.length; i += BATCH_LIMIT) {
+                const batch = db.batch();
+                for (const { roomId, severity, ai_reason } of rooms.slice(i, i + BATCH_LIMIT)) {
+                    batch.set(collection.doc(), { roomId, severity, ai_reason, createdAt });
+                }
+                await batch.commit();
+            }
+
+            return res.status(200).json({
+            status: "success",
+            message: "Rooms flagged successfully",
+            flagged: rooms.map(r => r.roomId),
+            });
+
+    } catch (error) {
+        console.error("Flag rooms error:", error);
+        return res.status(500).json({
+        status: "error",
+        message: "Internal server error",
+        });
+    }
+}
+
+export default flag_rooms
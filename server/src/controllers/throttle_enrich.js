@@ -0,0 +1,39 @@
+import { db } from "../firebaseadmin/firebaseadmin.js";
+
+// Attaches the AI analysis to an alert that was stored (or will be) under the same alertId
+const throttle_enrich = async (req, res) => {
+    const { alertId, aiAnalysis, analyzedAt } = req.body;
+
+    try {
+        if (!alertId || !aiAnalysis) {
+            return res.status(400).json({
+                status: "error",
+                message: "Missing required fields",
+            });
+        }
+
+        await db.collection("women")
+                .doc("flaggedRoom")
+                .collection("throttle_room")
+                .doc(alertId)
+                .set({
+                    alertId,
+                    aiAnalysis,
+                    analyzedAt: analyzedAt || new Date().toISOString()
+                }, { merge: true });
+
+        return res.status(200).json({
+            status: "success",
+            message: "Alert enriched successfully",
+        });
+
+    } catch (error) {
+        console.error("throttle enrich error:", error);
+        return res.status(500).json({
+            status: "error",
+            message: "Internal server error",
+        });
+    }
+}
+
+export default throttle_enrich;
@@ -2,10 +2,12 @@ import { db } from "../firebaseadmin/firebaseadmin.js";
 // You don't need "firebase/firestore" imports when using the Admin SDK db directly
 
 const throttle_room = async (req, res) => {
-    const { triggeredByUserId, routeId, aiAnalysis, alertLevel, timestamp } = req.body;
+    const { alertId, triggeredByUserId, routeId, aiAnalysis, alertLevel, timestamp } = req.body;
     
     try {
-        if (!triggeredByUserId || !routeId || !aiAnalysis || !alertLevel || !timestamp) {
+        // Alerts with an alertId are acknowledged before the AI analysis exists;
+        // the analysis arrives later through /throttle-room/enrich
+        if (!triggeredByUserId || !routeId || (!aiAnalysis && !alertId) || !alertLevel || !timestamp) {
             return res.status(400).json({
                 status: "error",
                 message: "Missing required fields",
@@ -14,16 +16,24 @@ const throttle_room = async (req, res) => {
 
         // CORRECT FIX: Use Admin SDK chaining syntax
         // Path: women (col) -> flaggedRoom (doc) -> throttle_room (col)
-        await db.collection("women")
+        const alerts = db.collection("women")
                 .doc("flaggedRoom")
-                .collection("throttle_room")
-                .add({
+                .collection("throttle_room");
+
+        if (alertId) {
+            // Merge so the alert and its enrichment can arrive in either order
+            const record = { alertId, triggeredByUserId, routeId, alertLevel, timestamp };
+            if (aiAnalysis) record.aiAnalysis = aiAnalysis;
+            await alerts.doc(alertId).set(record, { merge: true });
+        } else {
+            await alerts.add({
                     triggeredByUserId,
                     routeId,
                     aiAnalysis,
                     alertLevel,
                     timestamp  // Saves the timestamp passed from frontend
                 });
+        }
 
         return res.status(200).json({
             status: "success",
@@ -1,12 +1,16 @@
 import express from "express";
 import room_data from "../controllers/room_data.js";
 import flag_room from "../controllers/flag_room.js";
+import flag_rooms from "../controllers/flag_rooms.js";
 import throttle_room from "../controllers/throttle_room.js";
+import throttle_enrich from "../controllers/throttle_enrich.js";
 const router = express.Router();
 
 router.post("/room_data",room_data)
 router.post("/flag-room",flag_room)
+router.post("/flag-rooms",flag_rooms)
 router.post("/throttle-room",throttle_room)
+router.post("/throttle-room/enrich",throttle_enrich)
 
 export default router;
 